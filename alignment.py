@@ -0,0 +1,38 @@
+import heapq
+
+def align_bar_streams(streams, empty_bars=None):
+    """
+    Streaming k-way merge of per-symbol bar streams into one timeline.
+
+    Each stream yields (timestamp, bar) sorted by timestamp. The streams are merged with a heap keyed on
+    the next timestamp of each symbol, so only one pending bar per symbol is held at a time.
+    For every distinct timestamp of the union of all streams, one aligned slice is emitted, holding for
+    each symbol its latest bar at or before that timestamp (forward filled lazily, no padded copies).
+
+    :param streams: dict of symbol -> iterable of (timestamp, bar)
+    :param empty_bars: dict of symbol -> bar emitted before the symbol's first bar, None if not given
+    :return: generator of (timestamp, latest) where latest is a dict of symbol -> bar.
+             The same dict is updated in place at every step, copy it if it should be kept.
+    """
+    empty_bars = empty_bars or {}
+    latest = dict((s, empty_bars.get(s)) for s in streams)
+
+    heap = []
+    for order, (s, stream) in enumerate(streams.items()):
+        stream = iter(stream)
+        for timestamp, bar in stream:
+            heap.append((timestamp, order, s, bar, stream))
+            break
+    heapq.heapify(heap)
+
+    while heap:
+        timestamp = heap[0][0]
+        while heap and heap[0][0] == timestamp:
+            _, order, s, bar, stream = heap[0]
+            latest[s] = bar
+            for next_timestamp, next_bar in stream:
+                heapq.heapreplace(heap, (next_timestamp, order, s, next_bar, stream))
+                break
+            else:
+                heapq.heappop(heap)
+        yield timestamp, latest
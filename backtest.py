@@ -1,8 +1,42 @@
 import datetime
+import os
 import pprint
 import queue
 import time
-import matplotlib.pyplot as plt
+import pandas as pd
+
+from event import MarketEvent, SignalEvent, OrderEvent, FillEvent
+from eventbus import EventQueue, EventDispatcher
+from instrumentation import Instrumentation, NullInstrumentation, perf_counter_ns
+from journal import EventJournal
+from checkpoint import save_checkpoint, load_checkpoint, restore_checkpoint
+from resultsink import ResultsSink
+
+def plot_equity_curves(curves, headless=False, plot_path=None):
+    """
+    Plots equity curves. matplotlib is only imported here, batch runs that never plot never load it.
+    :param curves: dict of label -> equity curve Series
+    :param headless: If True, no window is opened: the figure is drawn with the Agg backend and saved to plot_path,
+                     or nothing is plotted at all when plot_path is None
+    :param plot_path: Image file the figure is saved to (ex. equity_curve.png)
+    """
+    if headless and plot_path is None:
+        return
+    import matplotlib
+    if headless:
+        matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots()
+    for label, curve in curves.items():
+        curve.plot(ax=ax, label=label)
+    if len(curves) > 1:
+        ax.legend()
+    if plot_path is not None:
+        fig.savefig(plot_path)
+    if not headless:
+        plt.show()
+    plt.close(fig)
 
 class Backtest(object):
     """
@@ -11,7 +45,10 @@ class Backtest(object):
     """
     def __init__(
          self, csv_dir, symbol_list, initial_cap, heartbeat, start_date,
-         data_handler, execution_handler, portfolio, strategy
+         data_handler, execution_handler, portfolio, strategy, live=False,
+         instrument=False, instrument_report="instrumentation.json", verbose=True, journal=None,
+         checkpoint=None, checkpoint_every=100000, resume_from=None,
+         results=None, results_format='npz', equity_csv=None, headless=False, plot_path=None
     ):
         """
         Initialises backtest
@@ -24,6 +61,20 @@ class Backtest(object):
         :param execution_handler: (Class) Handles the Order/Fill for trade
         :param portfolio: (Class) Keeps track of portfolio current and prior positions + Risk Management can be added
         :param strategy: (Class) Generates signal based on market data
+        :param live: If True, uses the thread-safe queue.Queue instead of the deque based EventQueue
+        :param instrument: If True, records latency histograms per event type and handler, throughput and queue depth
+        :param instrument_report: Where simulate_trading exports the instrumentation (.json or .csv), None to skip
+        :param verbose: If False, nothing is printed from the event loop (progress, events, strategy crossings)
+        :param journal: Path of a binary event journal recording every signal/order/fill (see journal.py),
+                        appended to when resuming from a checkpoint saved with it
+        :param checkpoint: Path where the full engine state is saved every checkpoint_every bars and at the end of the data
+        :param checkpoint_every: Number of bars between checkpoints
+        :param resume_from: Path of a checkpoint to resume from, only bars after its last one are processed
+        :param results: Directory the positions/holdings history is streamed to during the run (see resultsink.py)
+        :param results_format: 'npz' or 'parquet' (needs pyarrow)
+        :param equity_csv: Path the equity curve is exported to as CSV, None to skip it
+        :param headless: If True, never opens a plot window (see plot_equity_curves), for batch jobs on servers
+        :param plot_path: Image file the equity curve plot is saved to, None to only show it (or skip it when headless)
         """
 
         self.csv_dir = csv_dir
@@ -37,7 +88,22 @@ class Backtest(object):
         self.portfolio_cls = portfolio
         self.strategy_cls = strategy
 
-        self.events = queue.Queue()
+        self.events = queue.Queue() if live else EventQueue()
+        self.dispatcher = EventDispatcher()
+        self.instrumentation = Instrumentation() if instrument else NullInstrumentation()
+        self.instrument_report = instrument_report
+        self.verbose = verbose
+        self.journal_path = journal
+        #a resumed run reopens its journal at the checkpoint (see _resume)
+        self.journal = EventJournal(journal, symbol_list=symbol_list) if journal is not None and resume_from is None else None
+        self.checkpoint = checkpoint
+        self.checkpoint_every = checkpoint_every
+        self.resume_from = resume_from
+        self.results = results
+        self.results_format = results_format
+        self.equity_csv = equity_csv
+        self.headless = headless
+        self.plot_path = plot_path
 
         self.signals = 0
         self.orders = 0
@@ -54,51 +120,121 @@ class Backtest(object):
          print("Creating DataHandler, Strategy, Portfolio and ExecutionHandler")
          self.data_handler = self.data_handler_cls(self.events, self.csv_dir, self.symbol_list)
          self.strategy = self.strategy_cls(self.data_handler, self.events)
+         self.strategy.verbose = self.verbose
+         self.data_handler.set_max_lookback(self.strategy.max_lookback)
+         portfolio_kwargs = {}
+         if self.results is not None and self.resume_from is None: #a resumed portfolio keeps its checkpointed sink
+             portfolio_kwargs['results_sink'] = ResultsSink(self.results, self.symbol_list, format=self.results_format)
          self.portfolio = self.portfolio_cls(self.data_handler, self.events, self.start_date,
-                                             self.initial_cap)
-         self.execution_handler = self.execution_handler_cls(self.events)
+                                             self.initial_cap, **portfolio_kwargs)
+         self.execution_handler = self.execution_handler_cls(self.events, bars=self.data_handler)
+         if self.resume_from is not None:
+             self._resume(self.resume_from)
+         self._register_handlers()
+
+    def _register_handlers(self):
+        """
+        Registers the handlers of each event type on the dispatcher.
+        """
+        #Resting orders are worked against the new bar before the strategy reacts to it
+        self.dispatcher.register(MarketEvent, self.execution_handler.on_market)
+        self.dispatcher.register(MarketEvent, self.strategy.calc_signals)
+        self.dispatcher.register(MarketEvent, self.portfolio.update_timeindex)
+        #Logging and counting are handlers of their own, so that instrumentation times the components alone
+        self.dispatcher.register(SignalEvent, self._on_signal)
+        self.dispatcher.register(SignalEvent, self.portfolio.update_signal)
+        self.dispatcher.register(OrderEvent, self._on_order)
+        self.dispatcher.register(OrderEvent, self.execution_handler.execute_order)
+        self.dispatcher.register(FillEvent, self._on_fill)
+        self.dispatcher.register(FillEvent, self.portfolio.update_fill)
+        self.instrumentation.instrument_dispatcher(self.dispatcher)
+
+    def save_checkpoint(self, path):
+        """
+        Saves the state of the data handler, portfolio, strategy and execution handler (see checkpoint.py).
+        Should be called between bars, when the event queue is empty.
+        """
+        counters = {'signals': self.signals, 'orders': self.orders, 'fills': self.fills}
+        if self.journal is not None:
+            self.journal.flush()
+            counters['journal_records'] = self.journal.written
+        save_checkpoint(path, self.data_handler, self.portfolio, self.strategy, self.execution_handler,
+                        counters=counters)
+
+    def _resume(self, path):
+        state = load_checkpoint(path)
+        counters = restore_checkpoint(state, self.data_handler, self.portfolio, self.strategy, self.execution_handler)
+        self.strategy.verbose = self.verbose
+        self.signals = counters.get('signals', 0)
+        self.orders = counters.get('orders', 0)
+        self.fills = counters.get('fills', 0)
+        if self.journal_path is not None:
+            if 'journal_records' not in counters:
+                raise ValueError("Checkpoint %s was saved without a journal, %s cannot be resumed" % (path, self.journal_path))
+            self.journal = EventJournal(self.journal_path, symbol_list=self.symbol_list,
+                                        resume_records=counters['journal_records'])
+        print("Resumed from %s after %s" % (path, state['data_handler']['bar_datetime']))
+
+    def _log_event(self, event):
+        if self.verbose:
+            print(event)
+        if self.journal is not None:
+            self.journal.record(event, self.data_handler.get_latest_bar_datetime(self.symbol_list[0]))
 
+    def _on_signal(self, event):
+        self._log_event(event)
+        self.signals += 1
+
+    def _on_order(self, event):
+        self._log_event(event)
+        self.orders += 1
+
+    def _on_fill(self, event):
+        self._log_event(event)
+        self.fills += 1
 
     def _run_backtest(self):
         """
         Executes backtest
         :return:
         """
+        instr = self.instrumentation if self.instrumentation.enabled else None
+        if instr is not None:
+            update_hist = instr.histogram("DataHandler.update_bars")
+            instr.start()
+
         i = 0
         while True:
             i += 1 # 여기에 Tqdm 넣어주면 좋을듯?
-            if i % 10000 == 1:
+            if self.verbose and i % 10000 == 1:
                 print(i)
             #Update the market bars
             if self.data_handler.continue_backtest == True:
-                self.data_handler.update_bars()
+                if instr is None:
+                    self.data_handler.update_bars()
+                else:
+                    t0 = perf_counter_ns()
+                    self.data_handler.update_bars()
+                    update_hist.record(perf_counter_ns() - t0)
+                    instr.bars += 1
             else:
                 break
+            if self.checkpoint is not None and not self.data_handler.continue_backtest:
+                #End of data, saved before the closing MarketEvent so that a resume over appended data lines up
+                self.save_checkpoint(self.checkpoint)
             #Handles the events
-            while True:
-                try:
-                    event = self.events.get(False)
-                except queue.Empty:
-                    break
-                else:
-                    if event is not None:
-                        if event.type == 'MARKET':
-                            self.strategy.calc_signals(event)
-                            self.portfolio.update_timeindex(event)
-                        elif event.type == 'SIGNAL':
-                            print(event)
-                            self.signals += 1
-                            self.portfolio.update_signal(event)
-                        elif event.type == 'ORDER':
-                            print(event)
-                            self.orders += 1
-                            self.execution_handler.execute_order(event)
-                        elif event.type == 'FILL':
-                            print(event)
-                            self.fills += 1
-                            self.portfolio.update_fill(event)
-
-        time.sleep(self.heartbeat) #Live Trading시 실제로 시간을 맞춰주려는 code인가? Backtest에서는 0.0으로 설정해버림.
+            self.dispatcher.drain(self.events, instr.record_queue_depth if instr is not None else None)
+            #Not at the end of the data, where the checkpoint taken before the closing MarketEvent is kept
+            if self.checkpoint is not None and i % self.checkpoint_every == 0 and self.data_handler.continue_backtest:
+                self.save_checkpoint(self.checkpoint)
+
+            if self.heartbeat:
+                time.sleep(self.heartbeat) #bar 사이 간격(초). Backtest에서는 0.0으로 설정, live 흉내낼 때만 사용
+
+        self.instrumentation.stop()
+        self.data_handler.close()
+        if self.journal is not None:
+            self.journal.close()
 
     def _output_performance(self):
         """
@@ -108,7 +244,7 @@ class Backtest(object):
         self.portfolio.create_equity_curve_dataframe()
 
         print("Creating Summary Stats....")
-        stats = self.portfolio.output_summary_stats()
+        stats = self.portfolio.output_summary_stats(csv_path=self.equity_csv)
 
         print("Creating Equity Curve...")
         pprint.pprint(stats)
@@ -119,8 +255,8 @@ class Backtest(object):
         print(self.portfolio.equity_curve.tail(10))  # 추후 보완 ㄱㄱ
 
         #plot equity curve
-        self.portfolio.equity_curve['equity_curve'].plot()
-        plt.show()
+        plot_equity_curves({'equity_curve': self.portfolio.equity_curve['equity_curve']},
+                           headless=self.headless, plot_path=self.plot_path)
 
     def simulate_trading(self):
         """
@@ -128,4 +264,120 @@ class Backtest(object):
         :return:
         """
         self._run_backtest()
-        self._output_performance()
\ No newline at end of file
+        self._output_performance()
+
+        if self.instrumentation.enabled and self.instrument_report is not None:
+            self.instrumentation.export(self.instrument_report)
+            print("Instrumentation report: %s" % self.instrument_report)
+
+class MultiStrategyBacktest(Backtest):
+    """
+    Runs several strategies, each with its own portfolio, over a single pass of the data.
+
+    Every MarketEvent is fanned out to all (strategy, portfolio) pairs. Each strategy gets its own strategy_id
+    (1, 2, ... in the given order), put on its signals and carried by the orders and fills,
+    so that fills are booked on the portfolio of the strategy that asked for them.
+    The data handler and execution handler are shared.
+    """
+    def __init__(self, csv_dir, symbol_list, initial_cap, heartbeat, start_date,
+                 data_handler, execution_handler, portfolio, strategies, **kwargs):
+        """
+        :param strategies: (List of classes) The strategies, ex. functools.partial(MovingAverageCrossStrategy, short_window=50)
+        :param kwargs: Other Backtest options, but checkpoint/resume_from which only handle one strategy
+        When results or equity_csv is given, each strategy writes to its own "_<strategy_id>" suffixed path.
+        """
+        if kwargs.get('checkpoint') is not None or kwargs.get('resume_from') is not None:
+            raise ValueError("MultiStrategyBacktest does not support checkpoint/resume")
+        self.strategy_classes = list(strategies)
+        super(MultiStrategyBacktest, self).__init__(
+            csv_dir, symbol_list, initial_cap, heartbeat, start_date,
+            data_handler, execution_handler, portfolio, None, **kwargs
+        )
+
+    @staticmethod
+    def _suffixed(path, strategy_id):
+        root, ext = os.path.splitext(path)
+        return "%s_%s%s" % (root, strategy_id, ext)
+
+    def _generate_trading_instances(self):
+        """
+        Generates one data handler and execution handler, and a strategy and portfolio per strategy class.
+        """
+        print("Creating DataHandler, %d Strategies, Portfolios and ExecutionHandler" % len(self.strategy_classes))
+        self.data_handler = self.data_handler_cls(self.events, self.csv_dir, self.symbol_list)
+
+        self.strategies = []
+        self.portfolios = {} #strategy_id -> Portfolio
+        for strategy_id, strategy_cls in enumerate(self.strategy_classes, 1):
+            strategy = strategy_cls(self.data_handler, self.events)
+            strategy.strategy_id = strategy_id
+            strategy.verbose = self.verbose
+            self.strategies.append(strategy)
+
+            portfolio_kwargs = {}
+            if self.results is not None:
+                portfolio_kwargs['results_sink'] = ResultsSink(self._suffixed(self.results, strategy_id),
+                                                               self.symbol_list, format=self.results_format)
+            self.portfolios[strategy_id] = self.portfolio_cls(self.data_handler, self.events, self.start_date,
+                                                              self.initial_cap, **portfolio_kwargs)
+        self.num_strats = len(self.strategies)
+
+        lookbacks = [s.max_lookback for s in self.strategies]
+        self.data_handler.set_max_lookback(None if None in lookbacks else max(lookbacks))
+        self.execution_handler = self.execution_handler_cls(self.events, bars=self.data_handler)
+        self._register_handlers()
+
+    def _register_handlers(self):
+        """
+        Registers every strategy and portfolio on MarketEvent, signals and fills are routed by strategy_id.
+        """
+        self.dispatcher.register(MarketEvent, self.execution_handler.on_market)
+        for strategy in self.strategies:
+            self.dispatcher.register(MarketEvent, strategy.calc_signals)
+        for portfolio in self.portfolios.values():
+            self.dispatcher.register(MarketEvent, portfolio.update_timeindex)
+        self.dispatcher.register(SignalEvent, self._on_signal)
+        self.dispatcher.register(SignalEvent, self._route_signal)
+        self.dispatcher.register(OrderEvent, self._on_order)
+        self.dispatcher.register(OrderEvent, self.execution_handler.execute_order)
+        self.dispatcher.register(FillEvent, self._on_fill)
+        self.dispatcher.register(FillEvent, self._route_fill)
+        self.instrumentation.instrument_dispatcher(self.dispatcher)
+
+        #The routers are timed by the dispatcher, the portfolio handlers they call are timed on their own
+        timed = self.instrumentation.timed
+        self._update_signal = dict(
+            (sid, timed("SignalEvent.Portfolio[%s].update_signal" % sid, p.update_signal))
+            for sid, p in self.portfolios.items())
+        self._update_fill = dict(
+            (sid, timed("FillEvent.Portfolio[%s].update_fill" % sid, p.update_fill))
+            for sid, p in self.portfolios.items())
+
+    def _route_signal(self, event):
+        self._update_signal[event.strategy_id](event)
+
+    def _route_fill(self, event):
+        self._update_fill[event.strategy_id](event)
+
+    def _output_performance(self):
+        """
+        Outputs the performance of every strategy, kept as a DataFrame in self.performance (one row per strategy_id).
+        """
+        print("Creating Summary Stats....")
+        rows = {}
+        curves = {}
+        for strategy_id, portfolio in self.portfolios.items():
+            portfolio.create_equity_curve_dataframe()
+            csv_path = self._suffixed(self.equity_csv, strategy_id) if self.equity_csv is not None else None
+            portfolio.output_summary_stats(csv_path=csv_path)
+            rows[strategy_id] = portfolio.performance_stats
+            curves["strategy %s" % strategy_id] = portfolio.equity_curve['equity_curve']
+        self.performance = pd.DataFrame.from_dict(rows, orient='index')
+        self.performance.index.name = 'strategy_id'
+
+        print(self.performance)
+        print("Signals: %s" % self.signals)
+        print("Orders: %s" % self.orders)
+        print("Fills: %s" % self.fills)
+
+        plot_equity_curves(curves, headless=self.headless, plot_path=self.plot_path)
@@ -0,0 +1,31 @@
+"""
+Benchmarks bootstrap_performance on a random walk minute equity curve: the time to get the
+confidence intervals of the Sharpe ratio, total return and max drawdown from n_resamples block bootstrap resamples.
+
+Run from the repository root:
+    python benchmarks/bench_bootstrap.py [n_bars] [n_resamples]
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bootstrap import bootstrap_performance
+
+def main():
+    n_bars = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    n_resamples = int(sys.argv[2]) if len(sys.argv) > 2 else 10000
+    returns = np.random.default_rng(0).normal(1e-5, 1e-3, n_bars)
+
+    for max_bytes in (64 * 1024 * 1024, 4 * 1024 * 1024):
+        start = time.perf_counter()
+        result = bootstrap_performance(returns, n_resamples, seed=0, max_bytes=max_bytes)
+        print("%d bars x %d resamples, %dMB chunks: %.2fs" % (
+            n_bars, n_resamples, max_bytes // (1024 * 1024), time.perf_counter() - start))
+    print(result.to_string())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Benchmarks the inner event loop of Backtest._run_backtest:
+queue.Queue + get(False)/queue.Empty + if/elif on event.type (previous loop)
+against EventQueue + EventDispatcher (current loop), on a stream of MarketEvents.
+
+Run from the repository root:
+    python benchmarks/bench_event_loop.py [n_events]
+"""
+import os
+import queue
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from event import MarketEvent, SignalEvent, OrderEvent, FillEvent
+from eventbus import EventQueue, EventDispatcher
+
+class Counter(object):
+    def __init__(self):
+        self.n = 0
+
+    def on_event(self, event):
+        self.n += 1
+
+def run_if_elif(n_events):
+    events = queue.Queue()
+    market, signal, order, fill = Counter(), Counter(), Counter(), Counter()
+    start = time.perf_counter()
+    for _ in range(n_events):
+        events.put(MarketEvent())
+        while True:
+            try:
+                event = events.get(False)
+            except queue.Empty:
+                break
+            else:
+                if event is not None:
+                    if event.type == 'MARKET':
+                        market.on_event(event)
+                    elif event.type == 'SIGNAL':
+                        signal.on_event(event)
+                    elif event.type == 'ORDER':
+                        order.on_event(event)
+                    elif event.type == 'FILL':
+                        fill.on_event(event)
+    return time.perf_counter() - start, market.n
+
+def run_dispatcher(n_events, events):
+    dispatcher = EventDispatcher()
+    market, signal, order, fill = Counter(), Counter(), Counter(), Counter()
+    dispatcher.register(MarketEvent, market.on_event)
+    dispatcher.register(SignalEvent, signal.on_event)
+    dispatcher.register(OrderEvent, order.on_event)
+    dispatcher.register(FillEvent, fill.on_event)
+    start = time.perf_counter()
+    for _ in range(n_events):
+        events.put(MarketEvent())
+        dispatcher.drain(events)
+    return time.perf_counter() - start, market.n
+
+def main(n_events=1000000):
+    results = [
+        ("queue.Queue + if/elif", run_if_elif(n_events)),
+        ("queue.Queue + EventDispatcher", run_dispatcher(n_events, queue.Queue())),
+        ("EventQueue + EventDispatcher", run_dispatcher(n_events, EventQueue())),
+    ]
+    base = results[0][1][0]
+    print("%d MarketEvents" % n_events)
+    for name, (elapsed, handled) in results:
+        assert handled == n_events
+        print("%-32s %8.3fs %12.0f events/s  x%.2f" % (name, elapsed, n_events / elapsed, base / elapsed))
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000000)
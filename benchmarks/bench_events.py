@@ -0,0 +1,92 @@
+"""
+Benchmarks event allocation: dict based event classes (previous event.py) against the
+slotted classes of event.py, and putting a new MarketEvent on the queue per bar against
+putting the one instance a data handler keeps.
+
+Run from the repository root:
+    python benchmarks/bench_events.py [n_events]
+"""
+import gc
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from event import MarketEvent, FillEvent
+from eventbus import EventQueue
+
+class DictMarketEvent(object):
+    def __init__(self):
+        self.type = 'MARKET'
+
+class DictFillEvent(object):
+    def __init__(self, timeindex, symbol, exchange, quantity, direction, fill_cost, est_fill_cost, commission=None):
+        self.type = "FILL"
+        self.timeindex = timeindex
+        self.symbol = symbol
+        self.exchange = exchange
+        self.quantity = quantity
+        self.direction = direction
+        self.fill_cost = fill_cost
+        self.est_fill_cost = est_fill_cost
+        self.commission = commission
+
+def timed(make, n_events):
+    gc.collect()
+    collections_before = sum(stat['collections'] for stat in gc.get_stats())
+    start = time.perf_counter()
+    for _ in range(n_events):
+        make()
+    elapsed = time.perf_counter() - start
+    collections = sum(stat['collections'] for stat in gc.get_stats()) - collections_before
+    return elapsed, collections
+
+def retained_bytes(make, n_events):
+    tracemalloc.start()
+    kept = [make() for _ in range(n_events)]
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del kept
+    return size / n_events
+
+def timed_put(n_events, reuse):
+    """
+    Puts and takes a MarketEvent n_events times, as update_bars and the event loop do.
+    """
+    events = EventQueue()
+    market_event = MarketEvent()
+    gc.collect()
+    collections_before = sum(stat['collections'] for stat in gc.get_stats())
+    start = time.perf_counter()
+    if reuse:
+        for _ in range(n_events):
+            events.put(market_event)
+            events.get()
+    else:
+        for _ in range(n_events):
+            events.put(MarketEvent())
+            events.get()
+    elapsed = time.perf_counter() - start
+    collections = sum(stat['collections'] for stat in gc.get_stats()) - collections_before
+    return elapsed, collections
+
+def main(n_events=1000000):
+    cases = [
+        ("MarketEvent, dict class", DictMarketEvent),
+        ("MarketEvent, slotted", MarketEvent),
+        ("FillEvent, dict class", lambda: DictFillEvent(None, "005930", "BT", 1, "BUY", None, 50000.0, 0.0)),
+        ("FillEvent, slotted", lambda: FillEvent(None, "005930", "BT", 1, "BUY", None, 50000.0, 0.0)),
+    ]
+    print("%d events" % n_events)
+    for name, make in cases:
+        elapsed, collections = timed(make, n_events)
+        size = retained_bytes(make, min(n_events, 100000))
+        print("%-26s %7.3fs  gc runs %5d  %6.1f bytes/event retained" % (name, elapsed, collections, size))
+    for name, reuse in (("put new MarketEvent", False), ("put kept MarketEvent", True)):
+        elapsed, collections = timed_put(n_events, reuse)
+        print("%-26s %7.3fs  gc runs %5d" % (name, elapsed, collections))
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000000)
@@ -0,0 +1,59 @@
+"""
+Benchmarks HistoricCSVDataHandlerHFT on synthetic ticks (see synthetic.generate_tick_csvs):
+the first load (CSV parse + .ticks.npy write), the memory-mapped reload, and the replay rate of
+update_bars alone and with a strategy-like read of every symbol's last price on each step.
+
+Run from the repository root:
+    python benchmarks/bench_hft_data.py [n_symbols] [n_ticks_per_symbol]
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from eventbus import EventQueue
+from hft_data import HistoricCSVDataHandlerHFT
+from synthetic import generate_tick_csvs
+
+def replay(handler, events, read_prices):
+    symbols = handler.symbol_list
+    start = time.perf_counter()
+    while handler.continue_backtest:
+        handler.update_bars()
+        events.get(False)
+        if read_prices:
+            for s in symbols:
+                handler.get_latest_bar_value(s, 'close')
+    return time.perf_counter() - start
+
+def main():
+    n_symbols = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    n_ticks = int(sys.argv[2]) if len(sys.argv) > 2 else 1000000
+    csv_dir = tempfile.mkdtemp(prefix="tbd_hft_")
+    try:
+        symbols = generate_tick_csvs(csv_dir, n_symbols, n_ticks)
+        events = EventQueue()
+
+        start = time.perf_counter()
+        HistoricCSVDataHandlerHFT(events, csv_dir, symbols)
+        print("first load (parse + cache): %.2fs" % (time.perf_counter() - start))
+        start = time.perf_counter()
+        handler = HistoricCSVDataHandlerHFT(events, csv_dir, symbols)
+        print("mapped load: %.3fs" % (time.perf_counter() - start))
+
+        n = n_symbols * n_ticks
+        for read_prices in (False, True):
+            handler = HistoricCSVDataHandlerHFT(events, csv_dir, symbols)
+            elapsed = replay(handler, events, read_prices)
+            print("%-36s %d ticks in %.2fs: %.2fM ticks/min" % (
+                "update_bars + get_latest_bar_value" if read_prices else "update_bars",
+                n, elapsed, n / elapsed * 60 / 1e6))
+    finally:
+        shutil.rmtree(csv_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
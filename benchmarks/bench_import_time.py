@@ -0,0 +1,48 @@
+"""
+Benchmarks the startup cost of the entry modules: each one is imported in a fresh interpreter
+and the wall time and the heavy optional modules it pulled in (matplotlib, statsmodels, ...) are reported.
+The plotting and regression libraries are only imported when they are used, so a headless batch run
+pays for pandas and NumPy only (pandas 2.x imports pyarrow itself when it is installed).
+
+Run from the repository root:
+    python benchmarks/bench_import_time.py [repeats]
+"""
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODULES = ["backtest", "ma_strategy", "intraday_pair_trading", "sweep", "hft_data"]
+HEAVY_MODULES = ["matplotlib", "matplotlib.pyplot", "statsmodels", "scipy", "pyarrow"]
+
+PROBE = """
+import sys, time
+start = time.perf_counter()
+import %s
+elapsed = time.perf_counter() - start
+print(elapsed)
+print(",".join(m for m in %r if m in sys.modules))
+"""
+
+def time_import(module, repeats):
+    """
+    :return: (best import time in seconds, heavy modules loaded)
+    """
+    best, heavy = float('inf'), ""
+    for _ in range(repeats):
+        out = subprocess.run([sys.executable, "-c", PROBE % (module, HEAVY_MODULES)],
+                             cwd=ROOT, capture_output=True, text=True, check=True).stdout.split("\n")
+        best = min(best, float(out[0]))
+        heavy = out[1]
+    return best, heavy
+
+def main():
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    print("%-24s %10s   %s" % ("module", "import s", "heavy modules loaded"))
+    for module in MODULES:
+        elapsed, heavy = time_import(module, repeats)
+        print("%-24s %10.3f   %s" % (module, elapsed, heavy or "-"))
+
+if __name__ == "__main__":
+    main()
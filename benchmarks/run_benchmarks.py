@@ -0,0 +1,230 @@
+"""
+Reproducible benchmark suite on synthetic minute bars (see synthetic.py).
+
+Times the data load (cold CSV parse and warm binary cache), update_bars,
+MovingAverageCrossStrategy.calc_signals, Portfolio.update_timeindex, the performance stats,
+writing/reading the results (CSV vs. resultsink) and a full simulate_trading run, and saves the results as JSON keyed by git commit,
+so that runs can be compared across commits.
+
+Run from the repository root:
+    python benchmarks/run_benchmarks.py [--symbols 5] [--bars 50000] [--gap 0.05] [--data DIR]
+                                        [--out benchmarks/results] [--compare OLD.json]
+"""
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from synthetic import generate_minute_csvs
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+@contextlib.contextmanager
+def quiet():
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+def timed(fn, repeat=1):
+    """
+    :return: best wall clock time (s) of fn over repeat runs and the last result
+    """
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def clear_cache(csv_dir):
+    for name in os.listdir(csv_dir):
+        if name.endswith(".npcache"):
+            shutil.rmtree(os.path.join(csv_dir, name))
+
+def bench_event_stages(handler_cls, csv_dir, symbols, start_date):
+    """
+    Drives the components by hand, timing each stage per call.
+    """
+    from eventbus import EventQueue
+    from event import MarketEvent
+    from ma_strategy import MovingAverageCrossStrategy
+    from portfolio import Portfolio
+
+    events = EventQueue()
+    with quiet():
+        bars = handler_cls(events, csv_dir, symbols)
+        strategy = MovingAverageCrossStrategy(bars, events)
+        bars.set_max_lookback(strategy.max_lookback)
+        portfolio = Portfolio(bars, events, start_date, 1000000.0)
+
+    t_update = t_signals = t_timeindex = 0.0
+    n = 0
+    clock = time.perf_counter
+    market = MarketEvent()
+    with quiet():
+        while bars.continue_backtest:
+            t0 = clock()
+            bars.update_bars()
+            t1 = clock()
+            strategy.calc_signals(market)
+            t2 = clock()
+            portfolio.update_timeindex(market)
+            t3 = clock()
+            events.clear() #signals are not acted upon here
+            t_update += t1 - t0
+            t_signals += t2 - t1
+            t_timeindex += t3 - t2
+            n += 1
+    return {
+        "bars": n,
+        "update_bars_s": t_update,
+        "calc_signals_s": t_signals,
+        "update_timeindex_s": t_timeindex,
+        "update_bars_per_s": n / t_update if t_update else 0.0,
+    }, portfolio
+
+def bench_results_io(portfolio, out_dir):
+    """
+    Writes the portfolio history as CSV and through a ResultsSink, and reads each back.
+    """
+    from resultsink import ResultsSink, read_results, parquet_available
+
+    history = portfolio.history
+    n = history.n_rows
+    results = {}
+
+    csv_path = os.path.join(out_dir, "results.csv")
+    def write_csv():
+        history.holdings_frame().join(history.positions_frame(), rsuffix="_position").to_csv(csv_path)
+    results["write_csv_s"], _ = timed(write_csv)
+    results["read_csv_s"], _ = timed(lambda: pd.read_csv(csv_path, index_col=0, parse_dates=True))
+    results["csv_bytes"] = os.path.getsize(csv_path)
+
+    for fmt in ("npz", "parquet"):
+        if fmt == "parquet" and not parquet_available():
+            continue
+        path = os.path.join(out_dir, "results_" + fmt)
+        def write_sink():
+            sink = ResultsSink(path, history.symbol_list, format=fmt)
+            for start in range(0, n, sink.batch_size):
+                rows = slice(start, min(start + sink.batch_size, n))
+                sink.write(history.datetimes[rows].view('datetime64[ns]'), history.positions[rows], history.holdings[rows],
+                           history.cash[rows], history.commission[rows], history.total_value[rows])
+            sink.close()
+        results["write_%s_s" % fmt], _ = timed(write_sink)
+        results["read_%s_s" % fmt], _ = timed(lambda: read_results(path))
+        results["%s_bytes" % fmt] = sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+    return results
+
+def run(args):
+    from backtest import Backtest
+    from data import HistoricMinDataHandler, HistoricMinArrayDataHandler
+    from execution import SimulatedExecutionHandler
+    from ma_strategy import MovingAverageCrossStrategy
+    from performance import create_performance_stats
+    from portfolio import Portfolio
+
+    tmp = None
+    csv_dir = args.data
+    if csv_dir is None:
+        tmp = tempfile.mkdtemp(prefix="tbd_bench_")
+        csv_dir = tmp
+    symbols = generate_minute_csvs(csv_dir, args.symbols, args.bars, args.gap, seed=args.seed)
+    start_date = datetime.datetime(2019, 11, 1, 9, 0, 0)
+    results = {}
+
+    try:
+        clear_cache(csv_dir)
+        results["load_cold_s"], _ = timed(lambda: HistoricMinDataHandler(None, csv_dir, symbols))
+        results["load_warm_s"], _ = timed(lambda: HistoricMinDataHandler(None, csv_dir, symbols), repeat=3)
+        results["load_array_s"], _ = timed(lambda: HistoricMinArrayDataHandler(None, csv_dir, symbols), repeat=3)
+
+        for name, cls in (("pandas", HistoricMinDataHandler), ("array", HistoricMinArrayDataHandler)):
+            stages, portfolio = bench_event_stages(cls, csv_dir, symbols, start_date)
+            results["stages_" + name] = stages
+
+        results["results_io"] = bench_results_io(portfolio, csv_dir)
+        portfolio.create_equity_curve_dataframe()
+        results["performance_stats_s"], _ = timed(
+            lambda: create_performance_stats(portfolio.equity_curve["total_value"], traded_value=1.0), repeat=3)
+
+        for name, cls in (("pandas", HistoricMinDataHandler), ("array", HistoricMinArrayDataHandler)):
+            def simulate():
+                with quiet():
+                    backtest = Backtest(csv_dir, symbols, 1000000.0, 0.0, start_date, cls,
+                                        SimulatedExecutionHandler, Portfolio, MovingAverageCrossStrategy,
+                                        headless=True)
+                    backtest.simulate_trading()
+                return backtest
+            results["simulate_trading_%s_s" % name], _ = timed(simulate)
+    finally:
+        if tmp is not None:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    return {
+        "commit": git_commit(),
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": platform.platform(),
+        "params": {"symbols": args.symbols, "bars": args.bars, "gap": args.gap, "seed": args.seed},
+        "results": results,
+    }
+
+def flatten(d, prefix=""):
+    out = {}
+    for k, v in d.items():
+        if isinstance(v, dict):
+            out.update(flatten(v, prefix + k + "."))
+        else:
+            out[prefix + k] = v
+    return out
+
+def compare(old, new):
+    a, b = flatten(old["results"]), flatten(new["results"])
+    print("%-40s %12s %12s %8s" % ("metric", old["commit"], new["commit"], "new/old"))
+    for key in sorted(set(a) & set(b)):
+        ratio = b[key] / a[key] if a[key] else float("nan")
+        print("%-40s %12.4f %12.4f %8.2f" % (key, a[key], b[key], ratio))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--symbols", type=int, default=5)
+    parser.add_argument("--bars", type=int, default=50000)
+    parser.add_argument("--gap", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--data", default=None, help="keep the synthetic CSVs in this directory")
+    parser.add_argument("--out", default=os.path.join(ROOT, "benchmarks", "results"))
+    parser.add_argument("--compare", default=None, help="previous results JSON to compare with")
+    args = parser.parse_args()
+
+    report = run(args)
+    os.makedirs(args.out, exist_ok=True)
+    path = os.path.join(args.out, "%s_%s.json" % (report["commit"], report["timestamp"].replace(":", "")))
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(json.dumps(report, indent=2))
+    print("Saved %s" % path)
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Synthetic minute bar generator, writing <symbol>_minute_prac.csv files in the exact format
+HistoricMinDataHandler reads: a header, a date column as %Y%m%d%H%M%S then close, open, high, low, volume.
+generate_tick_csvs() writes <symbol>_hft.csv tick files for HistoricCSVDataHandlerHFT.
+
+Run from the repository root:
+    python benchmarks/synthetic.py out_dir [n_symbols] [n_bars] [gap_prob]
+"""
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+def session_minutes(n_bars, start="2019-11-01"):
+    """
+    :return: DatetimeIndex of at least n_bars minutes of 09:00~15:29 sessions on business days
+    """
+    per_day = 390
+    days = pd.bdate_range(start, periods=n_bars // per_day + 1)
+    minutes = pd.to_timedelta(np.arange(per_day), unit="min") + pd.Timedelta(hours=9)
+    index = (days.values[:, None] + minutes.values[None, :]).ravel()
+    return pd.DatetimeIndex(index[:n_bars])
+
+def generate_minute_csvs(out_dir, n_symbols=10, n_bars=100000, gap_prob=0.05, seed=0, start="2019-11-01"):
+    """
+    Writes one random walk minute CSV per symbol.
+    :param out_dir: Directory the CSVs are written to
+    :param n_symbols: Number of symbols, named 000000, 000001, ...
+    :param n_bars: Number of session minutes covered
+    :param gap_prob: Probability that a minute has no bar for a symbol (no trade)
+    :param seed: Random seed, the same arguments always give the same files
+    :param start: First session date
+    :return: the list of symbols
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    index = session_minutes(n_bars, start)
+    symbols = ["%06d" % i for i in range(n_symbols)]
+
+    for s in symbols:
+        keep = rng.random(len(index)) >= gap_prob
+        dates = index[keep]
+        n = len(dates)
+        close = np.maximum(np.round(rng.uniform(10000, 100000) * np.exp(np.cumsum(rng.normal(0, 1e-3, n)))), 1)
+        spread = np.round(close * rng.uniform(0, 2e-3, n))
+        frame = pd.DataFrame({
+            "date": dates.strftime("%Y%m%d%H%M%S"),
+            "close": close,
+            "open": np.round(close + rng.normal(0, 1, n) * spread),
+            "high": close + spread,
+            "low": close - spread,
+            "volume": rng.integers(1, 10000, n),
+        })
+        frame.to_csv(os.path.join(out_dir, "%s_minute_prac.csv" % s), index=False)
+    return symbols
+
+def generate_tick_csvs(out_dir, n_symbols=10, n_ticks=1000000, mean_gap_ms=50.0, seed=0, start="2019-11-01 09:00:00"):
+    """
+    Writes one random walk tick CSV per symbol: datetime (ms resolution), bid, ask, last, volume.
+    :param n_ticks: Number of ticks per symbol
+    :param mean_gap_ms: Mean time between two ticks of a symbol, exponentially distributed
+    :return: the list of symbols
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    symbols = ["%06d" % i for i in range(n_symbols)]
+
+    for s in symbols:
+        gaps = np.maximum(np.round(rng.exponential(mean_gap_ms, n_ticks)), 1).astype("int64")
+        dates = pd.Timestamp(start) + pd.to_timedelta(np.cumsum(gaps), unit="ms")
+        last = np.maximum(np.round(rng.uniform(10000, 100000) * np.exp(np.cumsum(rng.normal(0, 1e-4, n_ticks)))), 1)
+        half_spread = np.maximum(np.round(last * 5e-4), 1)
+        frame = pd.DataFrame({
+            "datetime": dates.strftime("%Y-%m-%d %H:%M:%S.%f"),
+            "bid": last - half_spread,
+            "ask": last + half_spread,
+            "last": last,
+            "volume": rng.integers(1, 1000, n_ticks),
+        })
+        frame.to_csv(os.path.join(out_dir, "%s_hft.csv" % s), index=False)
+    return symbols
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if not args:
+        print(__doc__)
+        sys.exit(1)
+    generate_minute_csvs(args[0],
+                         int(args[1]) if len(args) > 1 else 10,
+                         int(args[2]) if len(args) > 2 else 100000,
+                         float(args[3]) if len(args) > 3 else 0.05)
@@ -0,0 +1,133 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from performance import periods_per_year
+
+STATS = ['sharpe_ratio', 'total_return', 'max_drawdown']
+
+def _block_summaries(log_growth, centered, length, max_bytes):
+    """
+    Summaries of the circular block of the given length starting at every bar, from which the stats of
+    any concatenation of blocks follow without going through its bars again.
+    With S_k the log growth after the k-th bar of a block (k = 1..length):
+    total = S_length, peak = max S_k, trough = min S_k, drawdown = max over i <= j of S_i - S_j,
+    s1/s2 = sum of the centered returns and of their squares.
+    :return: dict of arrays, one value per starting bar
+    """
+    n = log_growth.size
+    wrap = np.concatenate((log_growth, log_growth[:length]))
+    c = np.concatenate(([0.0], np.cumsum(wrap)))
+    wrap = np.concatenate((centered, centered[:length]))
+    c1 = np.concatenate(([0.0], np.cumsum(wrap)))
+    c2 = np.concatenate(([0.0], np.cumsum(wrap * wrap)))
+
+    summaries = {
+        'total': c[length:length + n] - c[:n],
+        's1': c1[length:length + n] - c1[:n],
+        's2': c2[length:length + n] - c2[:n],
+        'peak': np.empty(n),
+        'trough': np.empty(n),
+        'drawdown': np.empty(n),
+    }
+    windows = sliding_window_view(c[1:], length)[:n] #row s: log growth from the start up to bar s + k
+    rows = max(1, max_bytes // (length * 8 * 2))
+    for lo in range(0, n, rows):
+        w = windows[lo:lo + rows]
+        hi = lo + len(w)
+        run_max = np.maximum.accumulate(w, axis=1)
+        summaries['peak'][lo:hi] = run_max[:, -1] - c[lo:hi]
+        summaries['trough'][lo:hi] = w.min(axis=1) - c[lo:hi]
+        summaries['drawdown'][lo:hi] = (run_max - w).max(axis=1)
+    return summaries
+
+def _resample_stats(full, last, starts, mean, n, periods):
+    """
+    Stats of the resamples made of the blocks starting at starts (resamples x blocks),
+    the last block of each being the shorter remainder block.
+    """
+    def gather(name):
+        values = full[name][starts]
+        values[:, -1] = last[name][starts[:, -1]]
+        return values
+
+    s1 = gather('s1').sum(axis=1) / n
+    var = gather('s2').sum(axis=1) / n - s1 * s1
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sharpe = np.sqrt(periods_per_year(periods)) * (s1 + mean) / np.sqrt(var)
+    sharpe[~(var > 1e-10 * (var + s1 * s1))] = np.nan #constant returns
+
+    total = gather('total')
+    level = np.cumsum(total, axis=1) - total #log growth before each block
+    peak = level + gather('peak')
+    prior_peak = np.zeros_like(peak) #the initial equity is the first peak
+    np.maximum.accumulate(np.maximum(peak[:, :-1], 0.0), axis=1, out=prior_peak[:, 1:])
+    cross = prior_peak - (level + gather('trough')) #from a peak of an earlier block to a trough of this one
+    log_drawdown = np.maximum(gather('drawdown').max(axis=1), cross.max(axis=1))
+
+    return np.column_stack((sharpe, np.exp(level[:, -1] + total[:, -1]), -np.expm1(-log_drawdown)))
+
+def bootstrap_performance(returns, n_resamples=10000, block_size=None, confidence=0.95, periods="minutely",
+                          seed=None, max_bytes=64 * 1024 * 1024):
+    """
+    Circular block bootstrap of the period returns of an equity curve (ex. Portfolio.equity_curve['returns']).
+    Each resample is the returns of randomly started blocks of block_size bars laid end to end, which keeps
+    the short term autocorrelation of the returns, and the Sharpe ratio, total return and max drawdown
+    are computed for every resample as create_performance_stats does for the original curve.
+
+    Every block of the data is summarised once (see _block_summaries), so a resample costs one operation
+    per block instead of one per bar: the resamples x blocks matrices of a chunk are processed as whole arrays,
+    chunks holding at most max_bytes of them.
+    :param returns: A pandas series or NumPy array of period returns, NaNs (ex. the first bar) are left out
+    :param n_resamples: Number of bootstrap resamples
+    :param block_size: Bars per block, n ** (1/3) if None
+    :param confidence: Level of the percentile confidence intervals
+    :param periods: Daily, Hourly, Minutely (see periods_per_year)
+    :param seed: Random seed, or a np.random.Generator
+    :param max_bytes: Memory budget of the arrays of a chunk
+    :return: pandas DataFrame indexed by stat (sharpe_ratio, total_return, max_drawdown) with the estimate
+             on the original returns, the mean and standard deviation of the resamples and the lower/upper bounds.
+             The resampled stats (resamples x stats) are in its attrs['samples']
+    """
+    r = np.asarray(returns, dtype=np.float64)
+    r = r[~np.isnan(r)]
+    n = r.size
+    if n < 2:
+        raise ValueError("At least 2 returns are needed to bootstrap, got %d" % n)
+    if block_size is None:
+        block_size = int(round(n ** (1.0 / 3.0)))
+    block_size = max(1, min(int(block_size), n))
+    n_blocks = -(-n // block_size)
+    last_size = n - (n_blocks - 1) * block_size
+
+    mean = r.mean()
+    with np.errstate(divide='ignore'):
+        log_growth = np.log1p(r)
+    full = _block_summaries(log_growth, r - mean, block_size, max_bytes)
+    last = full if last_size == block_size else _block_summaries(log_growth, r - mean, last_size, max_bytes)
+
+    #the original curve is the resample of the consecutive blocks
+    estimate = _resample_stats(full, last, np.arange(n_blocks)[None, :] * block_size, mean, n, periods)[0]
+
+    rng = np.random.default_rng(seed)
+    samples = np.empty((n_resamples, len(STATS)))
+    chunk = max(1, max_bytes // (n_blocks * 8 * 8))
+    for lo in range(0, n_resamples, chunk):
+        starts = rng.integers(0, n, size=(min(chunk, n_resamples - lo), n_blocks))
+        samples[lo:lo + len(starts)] = _resample_stats(full, last, starts, mean, n, periods)
+
+    alpha = (1.0 - confidence) / 2.0
+    with warnings.catch_warnings(): #a stat that is NaN in every resample (ex. Sharpe of constant returns) stays NaN
+        warnings.simplefilter('ignore', RuntimeWarning)
+        lower, upper = np.nanpercentile(samples, [100.0 * alpha, 100.0 * (1.0 - alpha)], axis=0)
+        result = pd.DataFrame({
+            'estimate': estimate,
+            'mean': np.nanmean(samples, axis=0),
+            'std': np.nanstd(samples, axis=0),
+            'lower': lower,
+            'upper': upper,
+        }, index=STATS)
+    result.attrs['samples'] = samples
+    return result
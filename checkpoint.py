@@ -0,0 +1,57 @@
+import os
+import pickle
+
+CHECKPOINT_VERSION = 1
+
+#References to other components, rebound to the new instances on resume instead of being pickled
+_DETACHED = ('bars', 'events')
+
+def component_state(obj):
+    """
+    :param obj: Portfolio, Strategy or ExecutionHandler
+    :return: a copy of obj.__dict__ without its references to the data handler and the event queue
+    """
+    return dict((k, v) for k, v in obj.__dict__.items() if k not in _DETACHED)
+
+def save_checkpoint(path, data_handler, portfolio, strategy, execution_handler, counters=None):
+    """
+    Saves the full engine state into one pickle.
+    Everything goes through a single dump, so objects shared between components
+    (ex. the indicators a strategy registered on the data handler) stay shared when loaded.
+    The file is written next to path first and then renamed, a crash never leaves a half written checkpoint.
+    :param counters: Extra picklable values to keep (ex. signal/order/fill counts of the Backtest)
+    """
+    state = {
+        'version': CHECKPOINT_VERSION,
+        'data_handler': data_handler.get_state(),
+        'portfolio': component_state(portfolio),
+        'strategy': component_state(strategy),
+        'execution_handler': component_state(execution_handler),
+        'counters': counters or {},
+    }
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+def load_checkpoint(path):
+    """
+    :return: the state dict written by save_checkpoint()
+    """
+    with open(path, 'rb') as f:
+        state = pickle.load(f)
+    if state.get('version') != CHECKPOINT_VERSION:
+        raise ValueError("%s was written by an incompatible checkpoint version" % path)
+    return state
+
+def restore_checkpoint(state, data_handler, portfolio, strategy, execution_handler):
+    """
+    Restores freshly constructed components to the checkpointed state.
+    The data handler is moved to just after the last checkpointed bar, so only bars appended since are processed.
+    :return: the counters saved with the checkpoint
+    """
+    data_handler.restore_state(state['data_handler'])
+    portfolio.__dict__.update(state['portfolio'])
+    strategy.__dict__.update(state['strategy'])
+    execution_handler.__dict__.update(state['execution_handler'])
+    return state['counters']
@@ -0,0 +1,143 @@
+import json
+import os, os.path
+
+import numpy as np
+import pandas as pd
+
+CACHE_VERSION = 2
+CACHE_SUFFIX = ".npcache"
+
+def cache_dir_for(csv_path):
+    """
+    :return: the cache directory kept next to the CSV, ex) 005930_minute_prac.csv.npcache
+    """
+    return csv_path + CACHE_SUFFIX
+
+def source_signature(csv_path):
+    """
+    :return: (size, mtime in ns) of the source CSV, used to invalidate the cache
+    """
+    st = os.stat(csv_path)
+    return st.st_size, st.st_mtime_ns
+
+def cache_meta_is_valid(meta, csv_path, datetime_format, version=CACHE_VERSION):
+    """
+    A cache built from a CSV is valid only for the same source file, datetime format and cache layout version.
+    :param meta: dict read from the cache's meta file (version, datetime_format, src_size, src_mtime_ns)
+    :param csv_path: Path of the source CSV
+    :param datetime_format: Format the caller parses the CSV with
+    :param version: Cache layout version the caller expects
+    """
+    return meta.get("version") == version and meta.get("datetime_format") == datetime_format and \
+        [meta.get("src_size"), meta.get("src_mtime_ns")] == list(source_signature(csv_path))
+
+def _parse_csv(csv_path, datetime_format):
+    """
+    Parses the text CSV, indexed on the first column as datetime and sorted.
+    """
+    frame = pd.io.parsers.read_csv(csv_path, header=0, index_col=0)
+    frame.index = pd.to_datetime(frame.index, format=datetime_format)
+    frame.sort_index(inplace=True)
+    return frame
+
+def load_cache(csv_path, datetime_format=None):
+    """
+    Memory-maps the binary cache of the CSV if it is still valid.
+    Object (ex. string) columns cannot be memory-mapped, they are loaded in memory.
+    :param csv_path: Path of the source CSV
+    :param datetime_format: Format the cache must have been parsed with
+    :return: (index, columns, index_name) where index is an int64 array of ns timestamps and
+             columns an ordered list of (name, array) pairs; None if there is no valid cache
+    """
+    cache_dir = cache_dir_for(csv_path)
+    try:
+        with open(os.path.join(cache_dir, "meta.json")) as f:
+            meta = json.load(f)
+        if not cache_meta_is_valid(meta, csv_path, datetime_format):
+            return None
+        index = np.load(os.path.join(cache_dir, "index.npy"), mmap_mode='r')
+        columns = []
+        for i, name in enumerate(meta["columns"]):
+            path = os.path.join(cache_dir, "col_%d.npy" % i)
+            if name in meta["object_columns"]:
+                columns.append((name, np.load(path, allow_pickle=True)))
+            else:
+                columns.append((name, np.load(path, mmap_mode='r')))
+    except (OSError, ValueError, KeyError):
+        return None
+    return index, columns, meta["index_name"]
+
+def write_cache(csv_path, frame, datetime_format=None):
+    """
+    Writes the parsed frame as one .npy file per column plus the int64 timestamp index.
+    meta.json is written last, so a half written cache is never considered valid.
+    :param csv_path: Path of the source CSV
+    :param frame: DataFrame indexed on datetime as returned by _parse_csv
+    :param datetime_format: Format the frame was parsed with, a cache read with another format is invalid
+    """
+    cache_dir = cache_dir_for(csv_path)
+    meta_path = os.path.join(cache_dir, "meta.json")
+    os.makedirs(cache_dir, exist_ok=True)
+    if os.path.exists(meta_path):
+        os.remove(meta_path)
+
+    size, mtime_ns = source_signature(csv_path)
+    np.save(os.path.join(cache_dir, "index.npy"), frame.index.values.astype("datetime64[ns]").view(np.int64))
+    object_columns = []
+    for i, name in enumerate(frame.columns):
+        values = np.ascontiguousarray(frame[name].to_numpy())
+        if values.dtype == object: #pickled, loaded back in memory
+            object_columns.append(str(name))
+        np.save(os.path.join(cache_dir, "col_%d.npy" % i), values, allow_pickle=values.dtype == object)
+
+    meta = {
+        "version": CACHE_VERSION,
+        "src_size": size,
+        "src_mtime_ns": mtime_ns,
+        "datetime_format": datetime_format,
+        "index_name": frame.index.name,
+        "columns": [str(c) for c in frame.columns],
+        "object_columns": object_columns,
+    }
+    tmp_path = meta_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, meta_path)
+
+def read_minute_columns(csv_path, datetime_format="%Y%m%d%H%M%S", use_cache=True):
+    """
+    Reads a minute CSV as arrays, without building a DataFrame.
+
+    On first load the parsed data is written as memory-mappable NumPy arrays next to the CSV.
+    Later loads memory-map those arrays instead of parsing text, as long as the CSV size, mtime
+    and datetime_format are unchanged. When the cache cannot be written (ex. read-only drive) the CSV is simply parsed.
+    :param csv_path: Path of the CSV
+    :param datetime_format: Format of the datetime column
+    :param use_cache: False to always parse the text CSV
+    :return: (DatetimeIndex sorted, ordered list of (column name, array)), the arrays being read-only
+             memory maps of the cache when it was used
+    """
+    cached = load_cache(csv_path, datetime_format) if use_cache else None
+    if cached is not None:
+        index, columns, index_name = cached
+        return pd.DatetimeIndex(index.view("datetime64[ns]"), name=index_name), columns
+
+    frame = _parse_csv(csv_path, datetime_format)
+    if use_cache:
+        try:
+            write_cache(csv_path, frame, datetime_format)
+        except OSError:
+            pass
+    return frame.index, [(name, frame[name].to_numpy()) for name in frame.columns]
+
+def read_minute_csv(csv_path, datetime_format="%Y%m%d%H%M%S", use_cache=True):
+    """
+    Reads a minute CSV into a DataFrame indexed and sorted on datetime, through the cache of read_minute_columns.
+    The DataFrame holds its own copy of the columns, use read_minute_columns to keep them memory-mapped.
+    :param csv_path: Path of the CSV
+    :param datetime_format: Format of the datetime column
+    :param use_cache: False to always parse the text CSV
+    :return: pandas DataFrame
+    """
+    index, columns = read_minute_columns(csv_path, datetime_format, use_cache)
+    return pd.DataFrame(dict(columns), index=index, columns=[name for name, _ in columns])
@@ -1,9 +1,15 @@
 from abc import abstractmethod, ABCMeta
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
 import datetime
 import os, os.path
 import numpy as np
 import pandas as pd
+from alignment import align_bar_streams
+from csvcache import read_minute_csv, read_minute_columns
 from event import MarketEvent
+from ringbuffer import RingBuffer
 
 class DataHandler(object):
     """
@@ -70,19 +76,57 @@ class DataHandler(object):
         """
         raise NotImplementedError("Should implement update_bars()")
 
+    def set_max_lookback(self, max_lookback):
+        """
+        Declares the largest number of bars any consumer will ask for through get_latest_n_bars(_value),
+        so that the handler can bound the history it keeps. Handlers may ignore it.
+        :param max_lookback: Max number of bars kept per symbol, None for unbounded
+        """
+        pass
+
+    def add_indicator(self, symbol, val_type, indicator):
+        """
+        Registers an incremental indicator (see indicators.py) updated with val_type of every new bar of symbol.
+        :param indicator: An Indicator object
+        :return: the registered indicator, whose value can be read after each MarketEvent
+        """
+        raise NotImplementedError("Should implement add_indicator()")
+
+    def close(self):
+        """
+        Releases what the data handler holds open (ex. reader threads). Nothing by default.
+        """
+        pass
+
+    def get_state(self):
+        """
+        :return: A picklable snapshot of everything the handler accumulated so far (see checkpoint.py)
+        """
+        raise NotImplementedError("Should implement get_state()")
+
+    def restore_state(self, state):
+        """
+        Restores a snapshot from get_state() and moves the feed to just after its last bar.
+        """
+        raise NotImplementedError("Should implement restore_state()")
+
 class HistoricMinDataHandler(DataHandler):
     """
     HistoricMinDataHandler is design to read CSV files for each requested symbol from G-Drive
     and provide the "latest" bar in manner identical to a live trading interface
     """
 
-    def __init__(self, events, csv_dir, symbol_list):
+    #Parsed CSVs are cached as memory-mappable NumPy arrays next to the CSV (see csvcache.py)
+    use_csv_cache = True
+
+    def __init__(self, events, csv_dir, symbol_list, max_lookback=None):
         """
         Initialises the historic minute data handler by requesting the CSV files and a list of symbols.
         It will be assumed that all files are of the form 'symbol.csv', where symbol is a string in the list.
         :param events: The event queue
         :param csv_dir: Absolute directory path to CSV files.
         :param symbol_list: A list of symbol strings.
+        :param max_lookback: Max number of bars kept per symbol, None keeps the whole history
         """
 
         self.events = events
@@ -91,55 +135,149 @@ class HistoricMinDataHandler(DataHandler):
 
         self.symbol_data = {}
         self.latest_symbol_data = {}
+        self.latest_symbol_values = {} #symbol -> {val_type: RingBuffer}, only used when max_lookback is set
+        self.max_lookback = None
+        self.indicators = {} #symbol -> [(val_type, Indicator)]
         self.continue_backtest = True
+        self.bar_datetime = None #datetime of the last bar pushed
+        self._market_event = MarketEvent() #put on the queue on every bar, it carries no data
 
         self._open_convert_csv_files()
+        self.set_max_lookback(max_lookback)
 
     def _open_convert_csv_files(self):
         """
         Opens the CSV files from the data directory, converting them into pandas DataFrames within a symbol dictionary.
         For this handler it will be assumed that the data is take from internal G-Drive. Thus format will be hard coded.
+
+        The symbols are aligned on the union of their timestamps by a streaming merge (see alignment.py),
+        which pads each symbol forward lazily instead of reindexing full length copies.
+        Before its first bar, a symbol's bar is all NaN, as reindex(method='pad') gave.
         """
 
-        comb_index = None
+        streams = {}
+        empty_bars = {}
         for s in self.symbol_list:
-            #Load CSV with no header information, indexed on date
-            self.symbol_data[s] = pd.io.parsers.read_csv(
-                os.path.join(self.csv_dir, "%s_minute_prac.csv" % s), #hard coded!?
-                header=0, index_col=0
-                #,parse_dates=True,
-                #names=['date', 'close', 'open','high', 'low', 'volume'] #needed for getattr????
-            )
-            self.symbol_data[s].index = pd.to_datetime(self.symbol_data[s].index, format="%Y%m%d%H%M%S")
-            self.symbol_data[s].sort_index(inplace=True)
-
-            #Combine the index to pad forward values
-            if comb_index is None:
-                comb_index = self.symbol_data[s].index
-            else:
-                comb_index.union(self.symbol_data[s].index)
+            self.symbol_data[s] = self._read_symbol_csv(s)
+            streams[s] = self.symbol_data[s].iterrows() #use .iterrows() to make it as Generator object!
+            empty_bars[s] = pd.Series(np.nan, index=self.symbol_data[s].columns)
 
             #Set the latest symbol data to None
             self.latest_symbol_data[s] = []
-            #latest_symbol_data 다루는 방식 중요 / 점점 쌓여감
+            #latest_symbol_data 다루는 방식 중요 / max_lookback이 정해지면 ring buffer로 교체됨
+
+        self._bar_stream = align_bar_streams(streams, empty_bars)
+
+    def _read_symbol_csv(self, symbol):
+        """
+        Reads the minute CSV of a single symbol into a DataFrame indexed and sorted on datetime.
+        :param symbol: The symbol string
+        :return: pandas DataFrame of the symbol's bars
+        """
+        return read_minute_csv(self._symbol_csv_path(symbol), datetime_format="%Y%m%d%H%M%S",
+                               use_cache=self.use_csv_cache)
+
+    def _symbol_csv_path(self, symbol):
+        return os.path.join(self.csv_dir, "%s_minute_prac.csv" % symbol) #hard coded!?
 
+    def set_max_lookback(self, max_lookback):
+        """
+        Bounds the bars kept per symbol to the last max_lookback ones.
+        Bars are kept in a deque and each value type in a RingBuffer, so memory stays flat regardless of backtest length.
+        Should be called before the first update_bars().
+        :param max_lookback: Max number of bars kept per symbol, None for unbounded
+        """
+        self.max_lookback = max_lookback
         for s in self.symbol_list:
-            self.symbol_data[s] = self.symbol_data[s].\
-                                    reindex(index=comb_index, method='pad').iterrows() #use .iterrows() to make it as Generator object!
+            if max_lookback is None:
+                self.latest_symbol_data[s] = list(self.latest_symbol_data[s])
+                self.latest_symbol_values[s] = None
+            else:
+                self.latest_symbol_data[s] = deque(self.latest_symbol_data[s], maxlen=max_lookback)
+                self.latest_symbol_values[s] = {}
+                for bar in self.latest_symbol_data[s]:
+                    self._append_bar_values(s, bar)
 
-    def _get_new_bar(self, symbol):
+    def add_indicator(self, symbol, val_type, indicator):
         """
-        :return: the latest bar from data feed.
+        Registers an incremental indicator (see indicators.py) updated with val_type of every new bar of symbol.
+        :param indicator: An Indicator object
+        :return: the registered indicator, whose value can be read after each MarketEvent.
+                 May be an identical indicator registered before, so always use the returned one.
+        """
+        if symbol not in self.symbol_list:
+            print("Symbol is not available!!")
+            raise KeyError(symbol)
+
+        #An identical fresh indicator already registered (ex. by another strategy) is shared instead of computed twice
+        key = indicator.params()
+        if key is not None and indicator.count == 0:
+            for registered_type, registered in self.indicators.get(symbol, ()):
+                if registered_type == val_type and registered.count == 0 and registered.params() == key:
+                    return registered
+
+        self.indicators.setdefault(symbol, []).append((val_type, indicator))
+        return indicator
+
+    def get_state(self):
         """
-        for bar in self.symbol_data[symbol]:
-            yield bar
+        :return: A picklable snapshot of the bars, ring buffers and indicators accumulated so far
+        """
+        return {
+            'bar_datetime': self.bar_datetime,
+            'max_lookback': self.max_lookback,
+            'latest_symbol_data': self.latest_symbol_data,
+            'latest_symbol_values': self.latest_symbol_values,
+            'indicators': self.indicators,
+        }
+
+    def restore_state(self, state):
+        """
+        Restores a snapshot from get_state() and skips the feed past its last bar.
+        Bars appended to the CSVs after the checkpoint are then the only ones pushed,
+        bars added at or before the checkpointed datetime are skipped.
+        """
+        self.max_lookback = state['max_lookback']
+        self.latest_symbol_data = state['latest_symbol_data']
+        self.latest_symbol_values = state['latest_symbol_values']
+        self.indicators = state['indicators']
+        self.bar_datetime = last = state['bar_datetime']
+        if last is None:
+            return
+
+        #Walks the merged stream so that the forward filled latest bars are right, without touching any state
+        timestamp = None
+        for timestamp, latest in self._bar_stream:
+            if timestamp >= last:
+                break
+        if timestamp != last:
+            raise ValueError("Bar %s of the checkpoint is not in the data anymore" % last)
+        self.continue_backtest = True
+
+    def _append_bar_values(self, symbol, bar):
+        """
+        Pushes every value of the bar into the ring buffer of its value type.
+        """
+        buffers = self.latest_symbol_values[symbol]
+        for val_type, value in bar[1].items():
+            try:
+                buffers[val_type].append(value)
+            except KeyError:
+                buffers[val_type] = RingBuffer(self.max_lookback, dtype=np.asarray(value).dtype)
+                buffers[val_type].append(value)
 
-        #using yield method to create Generater to make it iterable.
-        #Thus we can use next() function in update_bars
+    def _get_new_bars(self):
+        """
+        :return: the next aligned (datetime, {symbol: bar}) slice from the data feed.
+        Raises StopIteration when all symbols are exhausted.
+        """
+        timestamp, latest = next(self._bar_stream)
+        self.bar_datetime = timestamp
+        return timestamp, latest
+        #_bar_stream is a Generator, so next() walks it one timestamp at a time
         #cf) Generater is iterater and memory efficient. Best for large dataset iterating only once in lifetime
         #https://tech.ssut.me/what-does-the-yield-keyword-do-in-python/
 
-
     def get_latest_bar(self, symbol):
         """
         :return: the last bar from the latest_symbol list.
@@ -162,7 +300,9 @@ class HistoricMinDataHandler(DataHandler):
             print("Symbol is not available!!")
             raise
         else:
-            return bars_list[-N:]
+            if self.max_lookback is None:
+                return bars_list[-N:]
+            return list(islice(bars_list, max(len(bars_list) - N, 0), None))
         #update bar에서 latest_symbol_data에 넣어주는건 bar 하나인데 어떻게 -N개 만큼 가져올수 있는거지?
 
     def get_latest_bar_datetime(self, symbol):
@@ -196,6 +336,12 @@ class HistoricMinDataHandler(DataHandler):
         :param N: Number of bars considered
         :return: returns one of N-bars values designated by val_type
         """
+        if self.max_lookback is not None and symbol in self.latest_symbol_values:
+            buffers = self.latest_symbol_values[symbol]
+            if not buffers: #no bar updated yet
+                return np.array([])
+            return buffers[val_type].latest(N).copy()
+
         try:
             bars_list = self.get_latest_n_bars(symbol, N)
         except KeyError:
@@ -209,16 +355,307 @@ class HistoricMinDataHandler(DataHandler):
         Pushes the latest bars to the bars_queue for each symbol in a tuple OHLCV format:
         (datetime, open, high, low, close, volume)
         """
+        try:
+            timestamp, latest = self._get_new_bars()
+        except StopIteration: #when next() function gets to end, it emits StopIteration error
+            self.continue_backtest = False
+        else:
+            for s in self.symbol_list:
+                bar = (timestamp, latest[s])
+                if bar[1] is not None:
+                    self.latest_symbol_data[s].append(bar)
+                    if self.max_lookback is not None:
+                        self._append_bar_values(s, bar)
+                    for val_type, indicator in self.indicators.get(s, ()):
+                        indicator.update(bar[1][val_type])
+
+        self.events.put(self._market_event) # put() 함수는 Queue에 Item을 넣는 함수
+
+
+class HistoricMinChunkedDataHandler(HistoricMinDataHandler):
+    """
+    HistoricMinChunkedDataHandler streams the same minute CSV files out-of-core, for datasets larger than RAM.
+
+    Each file is read in fixed size chunks, and the next chunk of each symbol is parsed by a background
+    thread pool while the current one is consumed. Only the current and the prefetched chunk, plus the
+    lookback window (see set_max_lookback), are resident per symbol, and bars are emitted as soon as the
+    first chunks are read. Peak memory is bounded by about 2 x chunksize x number of symbols rows.
+
+    The CSV rows of each file must already be in ascending datetime order (a file is never fully loaded to be sorted).
+    """
+
+    def __init__(self, events, csv_dir, symbol_list, max_lookback=None, chunksize=10000, prefetch_workers=4):
+        """
+        Initialises the chunked minute data handler.
+        :param events: The event queue
+        :param csv_dir: Absolute directory path to CSV files.
+        :param symbol_list: A list of symbol strings.
+        :param max_lookback: Max number of bars kept per symbol, should be set for memory to stay bounded
+        :param chunksize: Number of CSV rows parsed at a time per symbol
+        :param prefetch_workers: Number of threads parsing the next chunks in the background
+        """
+        self.chunksize = chunksize
+        self._prefetch_pool = ThreadPoolExecutor(max_workers=prefetch_workers)
+        super(HistoricMinChunkedDataHandler, self).__init__(events, csv_dir, symbol_list, max_lookback)
+
+    def update_bars(self):
+        super(HistoricMinChunkedDataHandler, self).update_bars()
+        if not self.continue_backtest: #every file is read, the prefetch threads are not needed anymore
+            self.close()
+
+    def close(self):
+        """
+        Shuts the prefetch thread pool down, cancelling the chunk reads not started yet.
+        """
+        self._prefetch_pool.shutdown(wait=True, cancel_futures=True)
+
+    def _open_convert_csv_files(self):
+        """
+        Sets up one chunked bar stream per symbol and the streaming merge aligning them.
+        Only the CSV headers are read here.
+        """
+        streams = {}
+        empty_bars = {}
         for s in self.symbol_list:
-            try:
-                bar = next(self._get_new_bar(s))
-            except StopIteration: #when next() function gets to end, it emits StopIteration error
-                self.continue_backtest = False
+            columns = pd.io.parsers.read_csv(self._symbol_csv_path(s), header=0, index_col=0, nrows=0).columns
+            streams[s] = self._chunked_bars(s)
+            empty_bars[s] = pd.Series(np.nan, index=columns)
+            self.latest_symbol_data[s] = []
+
+        self._bar_stream = align_bar_streams(streams, empty_bars)
+
+    @staticmethod
+    def _read_chunk(reader):
+        """
+        Parses the next chunk of a CSV reader, indexed on datetime. Runs on the prefetch threads.
+        :return: DataFrame, None when the file is exhausted
+        """
+        try:
+            chunk = next(reader)
+        except StopIteration:
+            reader.close()
+            return None
+        chunk.index = pd.to_datetime(chunk.index, format="%Y%m%d%H%M%S")
+        return chunk
+
+    def _chunked_bars(self, symbol):
+        """
+        Generator of the (datetime, pandas Series) bars of a symbol, reading its CSV chunk by chunk
+        and always keeping the read of the next chunk in flight.
+        """
+        reader = pd.io.parsers.read_csv(self._symbol_csv_path(symbol), header=0, index_col=0,
+                                        chunksize=self.chunksize)
+        future = self._prefetch_pool.submit(self._read_chunk, reader)
+        last_timestamp = None
+        while True:
+            chunk = future.result()
+            if chunk is None:
+                return
+            future = self._prefetch_pool.submit(self._read_chunk, reader)
+
+            if not chunk.index.is_monotonic_increasing or \
+                    (last_timestamp is not None and len(chunk) and chunk.index[0] < last_timestamp):
+                raise ValueError("%s is not sorted by datetime, which chunked reading requires" % symbol)
+            if len(chunk):
+                last_timestamp = chunk.index[-1]
+
+            for bar in chunk.iterrows():
+                yield bar
+
+
+class HistoricMinArrayDataHandler(HistoricMinDataHandler):
+    """
+    HistoricMinArrayDataHandler reads the same minute CSV files as HistoricMinDataHandler,
+    but keeps every symbol's preloaded columns as contiguous NumPy arrays plus a single cursor.
+
+    No pandas Series is created per bar: get_latest_bar_value is an index lookup and
+    get_latest_n_bars_value returns a zero-copy slice (read-only view) of the preloaded column.
+    The DataHandler interface is unchanged, so Portfolio and Strategy objects run as they are.
+    """
+
+    def __init__(self, events, csv_dir, symbol_list, max_lookback=None):
+        """
+        Initialises the array backed minute data handler.
+        :param events: The event queue
+        :param csv_dir: Absolute directory path to CSV files.
+        :param symbol_list: A list of symbol strings.
+        :param max_lookback: Recorded only, the preloaded arrays do not grow while backtesting
+        """
+        self.bar_index = None
+        self.symbol_columns = {}
+        self.n_bars = 0
+        self.cursor = 0 #Number of bars pushed so far, latest bar sits at cursor - 1
+        self._datetime_pos = -1 #bar_index position of the cached datetime, boxing a Timestamp is not free
+        self._datetime = None
+
+        super(HistoricMinArrayDataHandler, self).__init__(events, csv_dir, symbol_list, max_lookback)
+
+    def _open_convert_csv_files(self):
+        """
+        Opens the CSV files and converts each column of each symbol into a contiguous NumPy array
+        aligned (padded forward) on the combined datetime index.
+        The columns of a symbol that has a bar at every datetime of the combined index are the memory maps
+        of the CSV cache (see csvcache.py) as they are, only the other symbols' columns are copied to be aligned.
+        """
+        comb_index = None
+        for s in self.symbol_list:
+            self.symbol_data[s] = read_minute_columns(self._symbol_csv_path(s), datetime_format="%Y%m%d%H%M%S",
+                                                      use_cache=self.use_csv_cache)
+            index = self.symbol_data[s][0]
+            comb_index = index if comb_index is None else comb_index.union(index)
+
+        for s in self.symbol_list:
+            index, columns = self.symbol_data[s]
+            if index.equals(comb_index):
+                #plain ndarray view, indexing an np.memmap goes through its Python level subclass hooks
+                self.symbol_columns[s] = dict((col, self._readonly(np.asarray(values))) for col, values in columns)
             else:
-                if bar is not None:
-                    self.latest_symbol_data[s].append(bar)
+                #position of the last bar at or before each datetime, as reindex(method='pad')
+                pos = index.searchsorted(comb_index, side='right') - 1
+                missing = pos < 0
+                self.symbol_columns[s] = {}
+                for col, values in columns:
+                    aligned = values[np.maximum(pos, 0)]
+                    if missing.any():
+                        if aligned.dtype.kind in 'iub':
+                            aligned = aligned.astype(np.float64)
+                        aligned[missing] = np.nan
+                    self.symbol_columns[s][col] = self._readonly(aligned)
+            self.latest_symbol_data[s] = None #bars live in symbol_columns, nothing accumulates here
+
+        self.symbol_data = {} #the raw columns are no longer needed once aligned
+        self.bar_index = comb_index
+        self.n_bars = len(comb_index)
+
+    def set_max_lookback(self, max_lookback):
+        """
+        Nothing accumulates per bar in this handler, so the lookback is only recorded.
+        """
+        self.max_lookback = max_lookback
+
+    def get_state(self):
+        """
+        :return: A picklable snapshot of the cursor position and indicators, the arrays are reloaded from the CSVs
+        """
+        return {
+            'bar_datetime': self.bar_index[self.cursor - 1] if self.cursor else None,
+            'max_lookback': self.max_lookback,
+            'indicators': self.indicators,
+        }
+
+    def restore_state(self, state):
+        """
+        Restores a snapshot from get_state() and moves the cursor just after its last bar.
+        """
+        self.max_lookback = state['max_lookback']
+        self.indicators = state['indicators']
+        last = state['bar_datetime']
+        if last is None:
+            self.cursor = 0
+            return
+        self.cursor = self.bar_index.searchsorted(last, side='right')
+        if self.cursor == 0 or self.bar_index[self.cursor - 1] != last:
+            raise ValueError("Bar %s of the checkpoint is not in the data anymore" % last)
+        self.continue_backtest = True
+
+    def rewind(self, events):
+        """
+        Rewinds the handler to before the first bar, so that the loaded arrays can be reused by another backtest.
+        Registered indicators are dropped, the new strategy registers its own.
+        :param events: The event queue of the new backtest
+        :return: self
+        """
+        self.events = events
+        self.cursor = 0
+        self.continue_backtest = True
+        self.indicators = {}
+        self.max_lookback = None
+        return self
+
+    @staticmethod
+    def _readonly(arr):
+        """
+        Marks the array read-only, so that zero-copy slices handed to strategies cannot corrupt the data.
+        """
+        arr.flags.writeable = False
+        return arr
+
+    def _get_columns(self, symbol):
+        """
+        :return: the column dict of the symbol
+        """
+        try:
+            return self.symbol_columns[symbol]
+        except KeyError:
+            print("Symbol is not available!!")
+            raise
+
+    def _latest_pos(self):
+        """
+        :return: array position of the latest bar
+        """
+        if self.cursor == 0:
+            raise IndexError("No bar has been updated yet")
+        return self.cursor - 1
+
+    def _make_bar(self, columns, pos):
+        """
+        Builds a (datetime, pandas Series) bar tuple on demand, in the same form as HistoricMinDataHandler.
+        """
+        return (self.bar_index[pos], pd.Series(dict((col, arr[pos]) for col, arr in columns.items()),
+                                               name=self.bar_index[pos]))
+
+    def get_latest_bar(self, symbol):
+        """
+        :return: the last bar as a (datetime, pandas Series) tuple.
+        """
+        columns = self._get_columns(symbol)
+        return self._make_bar(columns, self._latest_pos())
+
+    def get_latest_n_bars(self, symbol, N=1):
+        """
+        :return: latest n bars or n-k if less available, as a list of (datetime, pandas Series) tuples
+        """
+        columns = self._get_columns(symbol)
+        return [self._make_bar(columns, pos) for pos in range(max(self.cursor - N, 0), self.cursor)]
+
+    def get_latest_bar_datetime(self, symbol):
+        """
+        :return: Python datetime object for the last bar
+        """
+        self._get_columns(symbol)
+        pos = self._latest_pos()
+        if pos != self._datetime_pos:
+            self._datetime = self.bar_index[pos]
+            self._datetime_pos = pos
+        return self._datetime
+
+    def get_latest_bar_value(self, symbol, val_type):
+        """
+        :param val_type: one of OHLCV, Quotes, Open Interest(OI)
+        :return: returns one of values designated by val_type
+        """
+        return self._get_columns(symbol)[val_type][self._latest_pos()]
+
+    def get_latest_n_bars_value(self, symbol, val_type, N=1):
+        """
+        :param val_type: one of OHLCV, Quotes, Open Interest(OI)
+        :param N: Number of bars considered
+        :return: read-only view of the last N (or n-k if less available) values designated by val_type
+        """
+        return self._get_columns(symbol)[val_type][max(self.cursor - N, 0):self.cursor]
+
+    def update_bars(self):
+        """
+        Advances the cursor by one bar for all symbols and pushes a MarketEvent.
+        """
+        if self.cursor < self.n_bars:
+            self.cursor += 1
+            for s, indicators in self.indicators.items():
+                columns = self.symbol_columns[s]
+                for val_type, indicator in indicators:
+                    indicator.update(columns[val_type][self.cursor - 1])
+        else:
+            self.continue_backtest = False
 
-        #?
-        # print("length: ", len(self.latest_symbol_data[s])) #Length가 계속 늘어남, 일정이상 커지면 과거 정보는 버려줘야하는거 아닌가?
-        # print(self.latest_symbol_data[s])
-        self.events.put(MarketEvent()) # put() 함수는 Queue에 Item을 넣는 함수
+        self.events.put(self._market_event)
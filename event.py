@@ -2,26 +2,37 @@ class Event(object):
     """
     Event is base class providing an interface for all subsequent events,
     that will trigger further events in the trading infrastructure
+
+    Events use __slots__ (no per-instance __dict__) since one is allocated per bar, signal, order and fill.
+    The event type string is a class attribute.
     """
-    pass
+    __slots__ = ()
+    type = None
 
 class MarketEvent(Event):
     """
     Handles the event of receiving a new market update with
     corresponding bars
+
+    A MarketEvent carries no data, so data handlers create one in __init__ and put
+    that same instance on the queue on every bar instead of allocating a new one.
     """
+    __slots__ = ()
+    type = 'MARKET'
 
     def __init__(self):
         """
         initialises the Marketevent
         """
-        self.type = 'MARKET'
+        pass
 
 class SignalEvent(Event):
     """
     Handles the event of sending a Signal from a Strategy object.
     This is received by a Portfolio object and acted upon
     """
+    __slots__ = ('strategy_id', 'symbol', 'datetime', 'signal_type', 'strength', 'cur_price')
+    type = "SIGNAL"
 
     def __init__(self, strategy_id, symbol, datetime, signal_type, strength, cur_price):
         """
@@ -33,7 +44,6 @@ class SignalEvent(Event):
         :param signal_type: "LONG" of "SHORT"
         :param strength: An adjustment factor to scale quantity at Portfolio level. Useful for pairs-trading
         """
-        self.type = "SIGNAL"
         self.strategy_id = strategy_id
         self.symbol = symbol
         self.datetime = datetime
@@ -46,28 +56,37 @@ class OrderEvent(Event):
     Handles the event of sending an Order to an execution system.
     The order contains a symbol (ex "005930"), a type (Market or Limit), quantity and a direction
     """
+    __slots__ = ('symbol', 'order_type', 'quantity', 'direction', 'est_fill_cost', 'limit_price', 'order_id',
+                 'strategy_id')
+    type = "ORDER"
 
-    def __init__(self, symbol, order_type, quantity, direction, est_fill_cost):
+    def __init__(self, symbol, order_type, quantity, direction, est_fill_cost, limit_price=None, order_id=None,
+                 strategy_id=None):
         """
         Initialises the order type.
         :param symbol: The instrument to trade
-        :param order_type: "MKT" or "LMT"
+        :param order_type: "MKT", "LMT" or "CANCEL" (cancels the resting order order_id)
         :param quantity: Non-negative INT
         :param direction: "BUY" or "SELL"
+        :param limit_price: Limit price of "LMT" orders
+        :param order_id: Identifies the order for partial fills and cancels, assigned by the execution handler if None
+        :param strategy_id: The strategy whose signal the order comes from, fills are routed back by it
         """
-        self.type = "ORDER"
         self.symbol = symbol
         self.order_type = order_type
         self.quantity = quantity
         self.direction = direction
         self.est_fill_cost = est_fill_cost
+        self.limit_price = limit_price
+        self.order_id = order_id
+        self.strategy_id = strategy_id
 
     def print_order(self):
         """
         Outputs the values within the Order.
         """
-        print("Order: Symbols=%s, Type=%s, Quantity=%s, Direction=%s, est_Fill_Cost=%s" %
-              (self.symbol, self.order_type, self.quantity, self.direction, self.est_fill_cost))
+        print("Order: Symbols=%s, Type=%s, Quantity=%s, Direction=%s, est_Fill_Cost=%s, Limit=%s" %
+              (self.symbol, self.order_type, self.quantity, self.direction, self.est_fill_cost, self.limit_price))
 
 class FillEvent(Event):
     """
@@ -75,8 +94,12 @@ class FillEvent(Event):
     Stores the quantity of an instrument actually filled and at what price.
     In addition, stores the commission of the trade from the brokerage
     """
+    __slots__ = ('timeindex', 'symbol', 'exchange', 'quantity', 'direction', 'fill_cost', 'est_fill_cost',
+                 'commission', 'order_id', 'strategy_id')
+    type = "FILL"
 
-    def __init__(self, timeindex, symbol, exchange, quantity, direction, fill_cost, est_fill_cost, commission=None):
+    def __init__(self, timeindex, symbol, exchange, quantity, direction, fill_cost, est_fill_cost, commission=None,
+                 order_id=None, strategy_id=None):
         """
         Initialises the FillEvent object.
         :param timeindex: The bar-resolution when the order was filled.
@@ -86,9 +109,9 @@ class FillEvent(Event):
         :param direction: The direction of fill ("BUY" or "SELL")
         :param fill_cost: Holding Value in Wons
         :param commission: Commission paid
+        :param order_id: The order filled, set for limit orders which may be filled in parts
+        :param strategy_id: The strategy of the order filled
         """
-
-        self.type = "FILL"
         self.timeindex = timeindex
         self.symbol = symbol
         self.exchange = exchange
@@ -96,6 +119,8 @@ class FillEvent(Event):
         self.direction = direction
         self.fill_cost = fill_cost #매입금액을 의미/ 내가 주문넣은 가격대비 비싸게 사면 반영댐(slippage)/ backtesting시에는 직접 계산
         self.est_fill_cost = est_fill_cost
+        self.order_id = order_id
+        self.strategy_id = strategy_id
 
         #Calculat Commission
         if commission is None:
@@ -0,0 +1,110 @@
+from collections import deque
+import queue
+
+class EventQueue(deque):
+    """
+    Plain deque based event queue for the single threaded backtest path.
+
+    Offers the part of the queue.Queue interface used by the engine (put, get(False), empty, qsize),
+    raising queue.Empty the same way, without the locking overhead of queue.Queue.
+    queue.Queue should still be used when events are produced from other threads (live trading).
+    """
+
+    put = deque.append
+    put_nowait = deque.append
+
+    def get(self, block=False, timeout=None):
+        """
+        Removes and returns the oldest event. Never blocks.
+        """
+        try:
+            return self.popleft()
+        except IndexError:
+            raise queue.Empty
+
+    get_nowait = get
+
+    def empty(self):
+        return not self
+
+    def qsize(self):
+        return len(self)
+
+
+class EventDispatcher(object):
+    """
+    Dispatches events to the handlers registered for their class, replacing the
+    if/elif chain on event.type strings. An event goes to the handlers of every class of its MRO,
+    most derived class first, each class's handlers in registration order.
+    """
+
+    def __init__(self):
+        self.registered = {} #event class -> handlers registered for it
+        self.handlers = {} #event class -> handlers resolved along its MRO, rebuilt on register
+        self.wrap = None #optional (event class, resolved handlers) -> handlers to call, ex. timed ones (instrumentation)
+
+    def register(self, event_cls, handler):
+        """
+        Registers a handler for events of event_cls (and its subclasses).
+        :param event_cls: An Event class ex) MarketEvent
+        :param handler: Callable taking the event
+        """
+        self.registered.setdefault(event_cls, []).append(handler)
+        self.handlers.clear()
+        return handler
+
+    def _resolve(self, event_cls):
+        """
+        Concatenates the handlers registered for the classes of the MRO of event_cls and caches them,
+        passed through wrap if set. The registrations themselves are never modified.
+        """
+        handlers = []
+        for cls in event_cls.__mro__:
+            handlers.extend(self.registered.get(cls, ()))
+        if self.wrap is not None:
+            handlers = self.wrap(event_cls, handlers)
+        self.handlers[event_cls] = handlers
+        return handlers
+
+    def dispatch(self, event):
+        """
+        Calls every handler registered for the class of event. None events are ignored.
+        """
+        if event is None:
+            return
+        try:
+            handlers = self.handlers[type(event)]
+        except KeyError:
+            handlers = self._resolve(type(event))
+        for handler in handlers:
+            handler(event)
+
+    def drain(self, events, queue_depth=None):
+        """
+        Dispatches events until the queue is empty, including events put by the handlers themselves.
+        :param events: An EventQueue or queue.Queue
+        :param queue_depth: Called with the queue size before every event is taken off it (instrumentation)
+        """
+        handlers = self.handlers
+        if isinstance(events, deque):
+            popleft = events.popleft
+            while events:
+                if queue_depth is not None:
+                    queue_depth(len(events))
+                event = popleft()
+                if event is not None:
+                    try:
+                        event_handlers = handlers[type(event)]
+                    except KeyError:
+                        event_handlers = self._resolve(type(event))
+                    for handler in event_handlers:
+                        handler(event)
+        else:
+            while True:
+                if queue_depth is not None:
+                    queue_depth(events.qsize())
+                try:
+                    event = events.get(False)
+                except queue.Empty:
+                    break
+                self.dispatch(event)
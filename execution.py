@@ -1,8 +1,10 @@
 from abc import ABCMeta, abstractmethod
 import datetime
+import math
 import queue
 
 from event import FillEvent, OrderEvent
+from orderbook import OrderBook, RestingOrder
 
 class ExecutionHandler(object):
     """
@@ -27,21 +29,40 @@ class ExecutionHandler(object):
         """
         raise NotImplementedError("Should implement execute_order()")
 
+    def on_market(self, event):
+        """
+        Called on every MarketEvent, before the strategy sees the bar, so that resting orders can be worked.
+        Handlers without resting orders may ignore it.
+        :param event: A MarketEvent
+        """
+        pass
+
 
 class SimulatedExecutionHandler(ExecutionHandler):
     """
-    The simulated execution handler simply converts all order objects into
+    The simulated execution handler simply converts all market orders into
     their equivalent fill objects automatically without latency, slippage or fill-ratio issues.
 
     This allow a straightforward "first-go" test of any strategy,
     before implementation with a more sophisticated execution handler.
+
+    Limit orders ("LMT") rest in a per-symbol OrderBook and are matched against the high/low
+    of every following bar, with partial fills when a volume participation cap is set.
+    An order with order_type "CANCEL" and the order_id of a resting order cancels what is left of it.
     """
-    def __init__(self, events):
+    def __init__(self, events, bars=None, participation=None):
         """
         Initialises the handler, setting the event queues up internally.
         :param events: The Queue of Event objects.
+        :param bars: The DataHandler, needed for limit orders
+        :param participation: Max fraction of a bar's volume filled per symbol for limit orders, None for no cap
         """
         self.events = events
+        self.bars = bars
+        self.participation = participation
+        self.books = {} #symbol -> OrderBook
+        self.active_symbols = set() #symbols with resting orders, the only ones looked at on each bar
+        self.next_order_id = 1
 
     def execute_order(self, event): #Naive Version 실질적으로는 Slippage 고려 필요. 호가잔량 정보 반영시켜보자.
         """
@@ -51,16 +72,83 @@ class SimulatedExecutionHandler(ExecutionHandler):
         :param event: Contains an Event object with order information.
         :return:
         """
-        if event.type == "ORDER":
+        if event.type == "ORDER" and event.order_type == "LMT":
+            self.place_limit_order(event)
+        elif event.type == "ORDER" and event.order_type == "CANCEL":
+            self.cancel_order(event.symbol, event.order_id)
+        elif event.type == "ORDER":
             fill_event = FillEvent(datetime.datetime.utcnow(),
                                    event.symbol,
                                    'BT',
-                                   event.quantity, event.direction, None, event.est_fill_cost)
+                                   event.quantity, event.direction, None, event.est_fill_cost,
+                                   strategy_id=event.strategy_id)
             #Fill Cost as None when Backtest(Portfolio 에서 계산해줌)
             #Live Trading에서는 HTS 매입단가 넣어주면됨.
             #order type도 반영안됨. 그냥 Close로 계산.
             self.events.put(fill_event)
 
+    def place_limit_order(self, event):
+        """
+        Rests a limit order in the book of its symbol. It is matched from the next bar on.
+        :param event: OrderEvent with order_type "LMT" and a limit_price, an order_id is assigned if missing
+        :return: the order_id
+        """
+        if self.bars is None:
+            raise ValueError("SimulatedExecutionHandler needs bars for limit orders")
+        if event.order_id is None:
+            event.order_id = self.next_order_id
+            self.next_order_id += 1
+        book = self.books.get(event.symbol)
+        if book is None:
+            book = self.books[event.symbol] = OrderBook(event.symbol)
+        book.add(RestingOrder(event.order_id, event.symbol, event.direction, event.limit_price, event.quantity,
+                              event.strategy_id))
+        self.active_symbols.add(event.symbol)
+        return event.order_id
+
+    def cancel_order(self, symbol, order_id):
+        """
+        Cancels what is left of a resting limit order.
+        :return: the cancelled RestingOrder, None if it was already filled or cancelled
+        """
+        book = self.books.get(symbol)
+        if book is None:
+            return None
+        order = book.cancel(order_id)
+        if not book:
+            self.active_symbols.discard(symbol)
+        return order
+
+    def on_market(self, event):
+        """
+        Matches the resting limit orders against the new bar of their symbol and puts a FillEvent per (partial) fill.
+        """
+        if not self.active_symbols:
+            return
+        for symbol in list(self.active_symbols):
+            open_price = self.bars.get_latest_bar_value(symbol, 'open')
+            high = self.bars.get_latest_bar_value(symbol, 'high')
+            low = self.bars.get_latest_bar_value(symbol, 'low')
+            if high != high or low != low: #NaN, the symbol has no bar yet
+                continue
+
+            max_quantity = None
+            if self.participation is not None:
+                volume = self.bars.get_latest_bar_value(symbol, 'volume')
+                max_quantity = int(math.floor(self.participation * volume)) if volume == volume else 0
+
+            book = self.books[symbol]
+            fills = book.match(open_price, high, low, max_quantity)
+            if fills:
+                timeindex = self.bars.get_latest_bar_datetime(symbol)
+                for order, quantity, price in fills:
+                    fill_cost = price * quantity
+                    self.events.put(FillEvent(timeindex, symbol, 'BT', quantity, order.direction,
+                                              fill_cost, fill_cost, order_id=order.order_id,
+                                              strategy_id=order.strategy_id))
+            if not book:
+                self.active_symbols.discard(symbol)
+
 
 class KiwoomExecutionHandler(ExecutionHandler):
     """
@@ -0,0 +1,241 @@
+import json
+import os, os.path
+
+import numpy as np
+import pandas as pd
+
+from data import DataHandler
+from event import MarketEvent
+from csvcache import source_signature, cache_meta_is_valid
+
+TICK_DTYPE = np.dtype([
+    ('timestamp', '<i8'), #ns since epoch
+    ('bid', '<f8'),
+    ('ask', '<f8'),
+    ('last', '<f8'),
+    ('volume', '<f8'),
+])
+
+#Bar style names mapped to tick fields, so that minute strategies and the execution handler work on ticks
+FIELD_ALIASES = {'close': 'last', 'open': 'last', 'high': 'last', 'low': 'last', 'price': 'last'}
+
+TICK_CACHE_SUFFIX = ".ticks.npy"
+TICK_CACHE_VERSION = 1
+
+def load_tick_array(csv_path, datetime_format=None):
+    """
+    Loads the ticks of a CSV (datetime, bid, ask, last, volume) as a memory-mapped structured array.
+    The CSV is parsed once and saved as <csv>.ticks.npy next to it, rebuilt when the CSV or datetime_format changes.
+    :param datetime_format: strftime format of the datetime column, None to infer it
+    :return: read-only structured array of TICK_DTYPE sorted by timestamp
+    """
+    npy_path = csv_path + TICK_CACHE_SUFFIX
+    meta_path = csv_path + ".ticks.json"
+    try:
+        with open(meta_path) as f:
+            if cache_meta_is_valid(json.load(f), csv_path, datetime_format, TICK_CACHE_VERSION):
+                return np.load(npy_path, mmap_mode='r')
+    except (OSError, ValueError, AttributeError):
+        pass
+
+    if os.path.exists(meta_path): #the cache is invalid until its new meta is written
+        os.remove(meta_path)
+    size, mtime_ns = source_signature(csv_path)
+    frame = pd.read_csv(csv_path, header=0)
+    ticks = np.empty(len(frame), dtype=TICK_DTYPE)
+    ticks['timestamp'] = pd.to_datetime(frame.iloc[:, 0], format=datetime_format).values.astype('datetime64[ns]').view('i8')
+    for name in ('bid', 'ask', 'last', 'volume'):
+        ticks[name] = frame[name].values if name in frame else np.nan
+    ticks = ticks[np.argsort(ticks['timestamp'], kind='stable')]
+
+    tmp_path = npy_path + ".tmp.npy"
+    np.save(tmp_path, ticks)
+    os.replace(tmp_path, npy_path)
+    with open(meta_path, 'w') as f: #written last, a half written cache is never considered valid
+        json.dump({"version": TICK_CACHE_VERSION, "datetime_format": datetime_format,
+                   "src_size": size, "src_mtime_ns": mtime_ns}, f)
+    return np.load(npy_path, mmap_mode='r')
+
+
+class HistoricCSVDataHandlerHFT(DataHandler):
+    """
+    HistoricCSVDataHandlerHFT reads second or tick level data, one '<symbol>_hft.csv' per symbol
+    with datetime, bid, ask, last and volume columns, and replays it tick by tick.
+
+    Each symbol is a memory-mapped NumPy structured array (see load_tick_array), so nothing is held
+    as pandas rows. The merged replay order of all symbols is computed once with a stable argsort
+    of the timestamps; update_bars then only moves per-symbol cursors over the ticks sharing the next timestamp.
+    get_latest_* read the arrays at the cursors. 'close' (and 'open', 'high', 'low') are aliases of 'last'.
+    Before its first tick, a symbol's values are NaN.
+    """
+
+    file_pattern = "%s_hft.csv"
+
+    def __init__(self, events, csv_dir, symbol_list, max_lookback=None, datetime_format=None):
+        """
+        :param events: The event queue
+        :param csv_dir: Absolute directory path to CSV files.
+        :param symbol_list: A list of symbol strings.
+        :param max_lookback: Recorded only, the mapped arrays do not grow while backtesting
+        :param datetime_format: strftime format of the datetime column, None to infer it
+        """
+        self.events = events
+        self.csv_dir = csv_dir
+        self.symbol_list = symbol_list
+        self.datetime_format = datetime_format
+        self.max_lookback = max_lookback
+        self.indicators = {} #symbol -> [(val_type, Indicator)]
+        self.continue_backtest = True
+
+        self.ticks = {} #symbol -> structured array
+        self.symbol_columns = {} #symbol -> {field or alias: column view}
+        self.cursors = [0] * len(symbol_list) #ticks consumed per symbol, a list as it is bumped on every tick
+        self._symbol_pos = dict((s, i) for i, s in enumerate(symbol_list))
+        self._datetime_cache = {} #symbol -> (cursor, Timestamp)
+        self._market_event = MarketEvent() #put on the queue on every step, it carries no data
+
+        self._open_tick_files()
+
+    def _open_tick_files(self):
+        """
+        Maps every symbol's ticks and computes the merged replay order.
+        """
+        for s in self.symbol_list:
+            #plain ndarray view of the mapping, indexing an np.memmap goes through its Python level subclass hooks
+            ticks = np.asarray(load_tick_array(os.path.join(self.csv_dir, self.file_pattern % s), self.datetime_format))
+            self.ticks[s] = ticks
+            columns = dict((name, ticks[name]) for name in TICK_DTYPE.names)
+            for alias, name in FIELD_ALIASES.items():
+                columns[alias] = columns[name]
+            self.symbol_columns[s] = columns
+
+        timestamps = np.concatenate([self.ticks[s]['timestamp'] for s in self.symbol_list])
+        owners = np.repeat(np.arange(len(self.symbol_list), dtype=np.int32),
+                           [len(self.ticks[s]) for s in self.symbol_list])
+        order = np.argsort(timestamps, kind='stable')
+        timestamps = timestamps[order]
+
+        #One step per distinct timestamp: the symbols of step k are merged_symbols[step_starts[k]:step_starts[k + 1]]
+        self.merged_symbols = owners[order].tolist()
+        new_step = np.ones(len(timestamps), dtype=bool)
+        new_step[1:] = timestamps[1:] != timestamps[:-1]
+        self.step_starts = np.append(np.flatnonzero(new_step), len(timestamps)).tolist()
+        self.step_timestamps = timestamps[new_step]
+        self.n_bars = len(self.step_starts) - 1
+        self.step = 0
+
+    def add_indicator(self, symbol, val_type, indicator):
+        """
+        Registers an incremental indicator (see indicators.py) updated with val_type of every new tick of symbol.
+        Unlike the minute handlers, an indicator only sees the ticks of its own symbol.
+        :return: the registered indicator
+        """
+        if symbol not in self._symbol_pos:
+            print("Symbol is not available!!")
+            raise KeyError(symbol)
+        self.indicators.setdefault(symbol, []).append((FIELD_ALIASES.get(val_type, val_type), indicator))
+        return indicator
+
+    def set_max_lookback(self, max_lookback):
+        """
+        Nothing accumulates per tick in this handler, so the lookback is only recorded.
+        """
+        self.max_lookback = max_lookback
+
+    def _cursor(self, symbol):
+        try:
+            return self.cursors[self._symbol_pos[symbol]]
+        except KeyError:
+            print("Symbol is not available!!")
+            raise
+
+    def get_latest_bar(self, symbol):
+        """
+        :return: the latest tick as (Timestamp, structured record), None before the first tick
+        """
+        c = self._cursor(symbol)
+        if c == 0:
+            return None
+        return self.get_latest_bar_datetime(symbol), self.ticks[symbol][c - 1]
+
+    def get_latest_n_bars(self, symbol, N=1):
+        """
+        :return: the latest N ticks or less, as a structured array view
+        """
+        c = self._cursor(symbol)
+        return self.ticks[symbol][max(c - N, 0):c]
+
+    def get_latest_bar_datetime(self, symbol):
+        """
+        :return: Timestamp of the latest tick of the symbol, None before the first tick
+        """
+        c = self._cursor(symbol)
+        if c == 0:
+            return None
+        cached = self._datetime_cache.get(symbol)
+        if cached is None or cached[0] != c:
+            cached = self._datetime_cache[symbol] = (c, pd.Timestamp(int(self.ticks[symbol]['timestamp'][c - 1])))
+        return cached[1]
+
+    def get_latest_bar_value(self, symbol, val_type):
+        """
+        :param val_type: 'bid', 'ask', 'last', 'volume', 'timestamp' or an alias ('close', ...)
+        :return: the value of the latest tick, NaN before the first tick
+        """
+        c = self._cursor(symbol)
+        if c == 0:
+            return float('nan')
+        return self.symbol_columns[symbol][val_type][c - 1]
+
+    def get_latest_n_bars_value(self, symbol, val_type, N=1):
+        """
+        :return: zero-copy view of the latest N values (or less if not available)
+        """
+        c = self._cursor(symbol)
+        return self.symbol_columns[symbol][val_type][max(c - N, 0):c]
+
+    def update_bars(self):
+        """
+        Advances the cursors of the symbols ticking at the next timestamp and pushes a MarketEvent.
+        """
+        step = self.step
+        if step < self.n_bars:
+            cursors = self.cursors
+            symbols = self.merged_symbols
+            for k in range(self.step_starts[step], self.step_starts[step + 1]):
+                i = symbols[k]
+                cursors[i] += 1
+                if self.indicators:
+                    s = self.symbol_list[i]
+                    for val_type, indicator in self.indicators.get(s, ()):
+                        indicator.update(self.symbol_columns[s][val_type][cursors[i] - 1])
+            self.step = step + 1
+        else:
+            self.continue_backtest = False
+
+        self.events.put(self._market_event)
+
+    def get_state(self):
+        """
+        :return: A picklable snapshot of the cursors and indicators, the arrays are mapped again from disk
+        """
+        return {
+            'bar_datetime': pd.Timestamp(int(self.step_timestamps[self.step - 1])) if self.step else None,
+            'step': self.step,
+            'cursors': list(self.cursors),
+            'max_lookback': self.max_lookback,
+            'indicators': self.indicators,
+        }
+
+    def restore_state(self, state):
+        """
+        Restores a snapshot from get_state(). Ticks appended after its last timestamp are the only ones replayed.
+        """
+        last = state['bar_datetime']
+        self.step = int(np.searchsorted(self.step_timestamps, last.value, side='right')) if last is not None else 0
+        if last is not None and self.step_timestamps[self.step - 1] != last.value:
+            raise ValueError("Tick %s of the checkpoint is not in the data anymore" % last)
+        self.cursors = list(state['cursors'])
+        self.max_lookback = state['max_lookback']
+        self.indicators = state['indicators']
+        self.continue_backtest = True
@@ -0,0 +1,167 @@
+import numpy as np
+import pandas as pd
+
+from resultsink import read_equity
+
+class PortfolioHistory(object):
+    """
+    Records the position and holdings history of a portfolio, one row per bar,
+    into preallocated NumPy matrices indexed by bar x symbol, doubling their capacity when full.
+
+    cash, commission and total value are kept as separate columns, and datetimes as int64 nanoseconds.
+    The DataFrames are built once at the end from the matrices, without per bar dicts.
+
+    With a ResultsSink (see resultsink.py), every matrix and column becomes a fixed size batch buffer
+    written to the sink whenever it is full, so memory no longer grows with the number of bars.
+    The equity columns are then read back from the sink for the performance stats (see equity_frame).
+    """
+
+    def __init__(self, symbol_list, capacity=1024, sink=None):
+        """
+        :param symbol_list: The list of symbol strings, giving the column order
+        :param capacity: Initial number of rows allocated, sink.batch_size when streaming to a sink
+        :param sink: A ResultsSink receiving the rows in batches of sink.batch_size, None keeps every row in memory
+        """
+        self.symbol_list = list(symbol_list)
+        self.n_rows = 0
+        self.sink = sink
+        self.flushed = 0 #rows already written to the sink, the buffers hold the rows from there on
+        capacity = sink.batch_size if sink is not None else max(int(capacity), 1)
+        n_symbols = len(self.symbol_list)
+
+        self.datetimes = np.zeros(capacity, dtype=np.int64) #ns since epoch, NaT for a missing datetime
+        self.positions = np.zeros((capacity, n_symbols), dtype=np.int64)
+        self.holdings = np.zeros((capacity, n_symbols), dtype=np.float64)
+        self.cash = np.zeros(capacity, dtype=np.float64)
+        self.commission = np.zeros(capacity, dtype=np.float64)
+        self.total_value = np.zeros(capacity, dtype=np.float64)
+
+    def __len__(self):
+        return self.n_rows
+
+    @property
+    def capacity(self):
+        return self.cash.shape[0]
+
+    def _grow(self):
+        """
+        Doubles the capacity of every matrix, when the history is kept in memory.
+        """
+        new_capacity = 2 * self.capacity
+        for name in ('datetimes', 'positions', 'holdings', 'cash', 'commission', 'total_value'):
+            old = getattr(self, name)
+            new = np.zeros((new_capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:self.n_rows] = old[:self.n_rows]
+            setattr(self, name, new)
+
+    def record(self, dt, positions, prices, cash, commission):
+        """
+        Appends a row, valuing positions at prices (market value = quantity * price).
+        :param dt: Datetime of the bar
+        :param positions: Quantities held, in symbol_list order
+        :param prices: Prices used for valuation (ex. close), in symbol_list order
+        :param cash: Cash in Wons
+        :param commission: Accumulated commission in Wons
+        :return: total value of the row
+        """
+        j = self.n_rows - self.flushed #row in the buffers
+        if j == self.capacity:
+            if self.sink is None:
+                self._grow()
+            else:
+                self.flush()
+                j = 0
+
+        try:
+            self.datetimes[j] = dt.value #pd.Timestamp
+        except AttributeError:
+            self.datetimes[j] = pd.Timestamp(dt).value #datetime.datetime, or None as NaT
+        self.positions[j] = positions
+        row = self.holdings[j]
+        np.multiply(self.positions[j], prices, out=row)
+        total = cash + row.sum()
+
+        self.cash[j] = cash
+        self.commission[j] = commission
+        self.total_value[j] = total
+        self.n_rows += 1
+        return total
+
+    def flush(self):
+        """
+        Writes the rows recorded since the last flush to the sink.
+        """
+        n = self.n_rows - self.flushed
+        if self.sink is None or n == 0:
+            return
+        self.sink.write(self.datetimes[:n].view('datetime64[ns]'), self.positions[:n], self.holdings[:n],
+                        self.cash[:n], self.commission[:n], self.total_value[:n])
+        self.flushed = self.n_rows
+
+    def close(self):
+        """
+        Flushes the last rows and closes the sink, if any.
+        """
+        if self.sink is not None:
+            self.flush()
+            self.sink.close()
+
+    def _index(self):
+        return pd.DatetimeIndex(self.datetimes[:self.n_rows].view('datetime64[ns]'), name='datetime')
+
+    def _check_in_memory(self):
+        if self.flushed:
+            raise ValueError("The rows were streamed to %s, read them back with resultsink.read_results()"
+                             % self.sink.path)
+
+    def positions_frame(self):
+        """
+        :return: DataFrame of quantities held, indexed on datetime with one column per symbol
+        """
+        self._check_in_memory()
+        return pd.DataFrame(self.positions[:self.n_rows], index=self._index(), columns=self.symbol_list)
+
+    def holdings_frame(self):
+        """
+        :return: DataFrame of market value per symbol plus cash, commission and total_value, indexed on datetime
+        """
+        self._check_in_memory()
+        frame = pd.DataFrame(self.holdings[:self.n_rows], index=self._index(), columns=self.symbol_list)
+        frame['cash'] = self.cash[:self.n_rows]
+        frame['commission'] = self.commission[:self.n_rows]
+        frame['total_value'] = self.total_value[:self.n_rows]
+        return frame
+
+    def equity_frame(self):
+        """
+        :return: DataFrame of cash, commission and total_value indexed on datetime, available with or without a sink.
+                 Once rows were streamed, the pending ones are flushed and the columns are read back from the sink
+        """
+        if self.flushed:
+            self.flush()
+            return read_equity(self.sink.path)
+        return pd.DataFrame({'cash': self.cash[:self.n_rows], 'commission': self.commission[:self.n_rows],
+                             'total_value': self.total_value[:self.n_rows]}, index=self._index())
+
+    def _row_dicts(self, matrix, extra):
+        self._check_in_memory()
+        rows = []
+        for i in range(self.n_rows):
+            d = dict(zip(self.symbol_list, matrix[i].tolist()))
+            for name, column in extra:
+                d[name] = column[i]
+            rows.append(d)
+        return rows
+
+    def positions_dicts(self):
+        """
+        :return: the history as the list of dicts Portfolio.all_positions used to hold
+        """
+        return self._row_dicts(self.positions, [('datetime', self._index())])
+
+    def holdings_dicts(self):
+        """
+        :return: the history as the list of dicts Portfolio.all_holdings used to hold
+        """
+        return self._row_dicts(self.holdings, [('datetime', self._index()), ('cash', self.cash),
+                                               ('commission', self.commission), ('total_value', self.total_value)])
@@ -0,0 +1,350 @@
+from abc import abstractmethod, ABCMeta
+from collections import deque
+import math
+
+class Indicator(object):
+    """
+    Indicator is an abstract base class providing an interface for incremental (streaming) indicators.
+
+    An indicator is registered on a DataHandler with add_indicator(symbol, val_type, indicator)
+    and updated once with the new value of every bar, so that strategies read its value in O(1)
+    instead of pulling the whole lookback window on every MarketEvent.
+    """
+
+    __metaclass__ = ABCMeta
+
+    value = float('nan')
+    count = 0 #Number of values seen so far
+
+    @abstractmethod
+    def update(self, x):
+        """
+        Updates the indicator with the value of a new bar.
+        :param x: The new value
+        :return: the updated indicator value
+        """
+        raise NotImplementedError("Should implement update()")
+
+    def params(self):
+        """
+        :return: A hashable key identifying indicators that compute the same values from the same input,
+                 so that a DataHandler can share one instance between strategies. None if it can't be shared.
+        """
+        return None
+
+
+class _WindowIndicator(Indicator):
+    """
+    Base of rolling window indicators. Keeps the window values in a deque and the position of the last NaN,
+    so that, like np.mean over the window, the value is NaN while a NaN is inside the window.
+    Until the window is full, the value is computed over the values available, i.e. bars[-window:].
+    """
+
+    def __init__(self, window):
+        """
+        :param window: Number of bars of the rolling window
+        """
+        if window < 1:
+            raise ValueError("window should be a positive integer")
+        self.window = window
+        self.values = deque()
+        self.count = 0
+        self._last_nan = -1 - window
+        self.value = float('nan')
+
+    def params(self):
+        return (type(self), self.window)
+
+    def _push(self, x):
+        """
+        Appends x to the window.
+        :return: the value leaving the window, None if the window is not full yet
+        """
+        if x != x: #NaN
+            self._last_nan = self.count
+        self.count += 1
+        self.values.append(x)
+        if len(self.values) > self.window:
+            return self.values.popleft()
+        return None
+
+    def _has_nan(self):
+        return self._last_nan > self.count - 1 - self.window
+
+
+class RollingSum(_WindowIndicator):
+    """
+    Rolling sum over the last window values, with Neumaier compensated summation so that
+    rounding errors do not build up over long backtests.
+    """
+
+    def __init__(self, window):
+        super(RollingSum, self).__init__(window)
+        self.sum = 0.0
+        self._comp = 0.0
+
+    def _add(self, x):
+        t = self.sum + x
+        if abs(self.sum) >= abs(x):
+            self._comp += (self.sum - t) + x
+        else:
+            self._comp += (x - t) + self.sum
+        self.sum = t
+
+    def update(self, x):
+        old = self._push(x)
+        if x == x:
+            self._add(x)
+        if old is not None and old == old:
+            self._add(-old)
+        self.value = float('nan') if self._has_nan() else self.sum + self._comp
+        return self.value
+
+
+class RollingMean(RollingSum):
+    """
+    Simple moving average over the last window values (or the values available if less).
+    """
+
+    def update(self, x):
+        total = super(RollingMean, self).update(x)
+        self.value = total / len(self.values)
+        return self.value
+
+
+class RollingVariance(_WindowIndicator):
+    """
+    Rolling variance over the last window values, using Welford's update when a value enters the window
+    and its inverse when a value leaves it.
+    """
+
+    def __init__(self, window, ddof=0):
+        """
+        :param window: Number of bars of the rolling window
+        :param ddof: Delta degrees of freedom, 0 as np.var
+        """
+        super(RollingVariance, self).__init__(window)
+        self.ddof = ddof
+        self.mean = 0.0
+        self._m2 = 0.0
+        self._n = 0 #Number of non NaN values in the window
+
+    def params(self):
+        return (type(self), self.window, self.ddof)
+
+    def update(self, x):
+        old = self._push(x)
+        if x == x:
+            self._n += 1
+            delta = x - self.mean
+            self.mean += delta / self._n
+            self._m2 += delta * (x - self.mean)
+        if old is not None and old == old:
+            self._n -= 1
+            if self._n == 0:
+                self.mean, self._m2 = 0.0, 0.0
+            else:
+                delta = old - self.mean
+                self.mean -= delta / self._n
+                self._m2 -= delta * (old - self.mean)
+
+        if self._has_nan() or self._n - self.ddof <= 0:
+            self.value = float('nan')
+        else:
+            self.value = max(self._m2, 0.0) / (self._n - self.ddof)
+        return self.value
+
+    @property
+    def std(self):
+        return math.sqrt(self.value) if self.value == self.value else float('nan')
+
+
+class _RollingExtremum(_WindowIndicator):
+    """
+    Rolling min/max with a monotonic deque of (position, value), amortised O(1) per update.
+    """
+
+    def __init__(self, window):
+        super(_RollingExtremum, self).__init__(window)
+        self._mono = deque()
+
+    @staticmethod
+    def _dominates(new, old):
+        raise NotImplementedError("Should implement _dominates()")
+
+    def update(self, x):
+        self._push(x)
+        pos = self.count - 1
+        mono = self._mono
+        if x == x:
+            while mono and self._dominates(x, mono[-1][1]):
+                mono.pop()
+            mono.append((pos, x))
+        while mono and mono[0][0] <= pos - self.window:
+            mono.popleft()
+
+        if self._has_nan() or not mono:
+            self.value = float('nan')
+        else:
+            self.value = mono[0][1]
+        return self.value
+
+
+class RollingMin(_RollingExtremum):
+    """
+    Rolling minimum over the last window values.
+    """
+
+    @staticmethod
+    def _dominates(new, old):
+        return new <= old
+
+
+class RollingMax(_RollingExtremum):
+    """
+    Rolling maximum over the last window values.
+    """
+
+    @staticmethod
+    def _dominates(new, old):
+        return new >= old
+
+
+class EMA(Indicator):
+    """
+    Exponential moving average, value = alpha * x + (1 - alpha) * previous value,
+    seeded with the first value. NaN values are skipped.
+    """
+
+    def __init__(self, span=None, alpha=None):
+        """
+        :param span: alpha is 2 / (span + 1), as pandas ewm(span=...)
+        :param alpha: Smoothing factor, used if span is None
+        """
+        if alpha is None:
+            if span is None or span < 1:
+                raise ValueError("Either span >= 1 or alpha should be given")
+            alpha = 2.0 / (span + 1.0)
+        self.alpha = alpha
+        self.count = 0
+        self.value = float('nan')
+
+    def params(self):
+        return (type(self), self.alpha)
+
+    def update(self, x):
+        self.count += 1
+        if x == x:
+            if self.value != self.value:
+                self.value = x
+            else:
+                self.value += self.alpha * (x - self.value)
+        return self.value
+
+
+class RollingOLS(object):
+    """
+    Rolling least squares regression of y on x over the last window (x, y) pairs, updated in O(1) per pair.
+
+    Keeps the window means and centred co-moments, with Welford's update when a pair enters the window
+    and its inverse when a pair leaves it, so nothing is refitted on each bar.
+    Besides the slope (hedge ratio), gives the z-score of the latest residual y - beta * x (- alpha)
+    against the residuals of the whole window under the current fit, as a batch refit would.
+    Unlike the Indicators, it takes two inputs, so it is updated by its owner rather than by a DataHandler.
+    """
+
+    def __init__(self, window, fit_intercept=True):
+        """
+        :param window: Number of pairs of the rolling window
+        :param fit_intercept: If False, regresses through the origin (y = beta * x), as sm.OLS(y, x) without a constant
+        """
+        if window < 2:
+            raise ValueError("window should be at least 2")
+        self.window = window
+        self.fit_intercept = fit_intercept
+        self.pairs = deque()
+        self.n = 0
+        self.mean_x = self.mean_y = 0.0
+        self._cxx = self._cyy = self._cxy = 0.0 #centred co-moments
+        self.x = self.y = float('nan') #latest pair
+
+    @property
+    def count(self):
+        return self.n
+
+    def _add(self, x, y):
+        self.n += 1
+        dx = x - self.mean_x
+        dy = y - self.mean_y
+        self.mean_x += dx / self.n
+        self.mean_y += dy / self.n
+        self._cxx += dx * (x - self.mean_x)
+        self._cyy += dy * (y - self.mean_y)
+        self._cxy += dx * (y - self.mean_y)
+
+    def _remove(self, x, y):
+        self.n -= 1
+        if self.n == 0:
+            self.mean_x = self.mean_y = 0.0
+            self._cxx = self._cyy = self._cxy = 0.0
+            return
+        dx = x - self.mean_x
+        dy = y - self.mean_y
+        self.mean_x -= dx / self.n
+        self.mean_y -= dy / self.n
+        self._cxx -= dx * (x - self.mean_x)
+        self._cyy -= dy * (y - self.mean_y)
+        self._cxy -= (x - self.mean_x) * dy
+
+    def update(self, x, y):
+        """
+        Adds a pair to the window. Pairs with a NaN are ignored.
+        :return: the updated beta
+        """
+        if x != x or y != y:
+            return self.beta
+        self.pairs.append((x, y))
+        self._add(x, y)
+        if len(self.pairs) > self.window:
+            self._remove(*self.pairs.popleft())
+        self.x, self.y = x, y
+        return self.beta
+
+    def _sums(self):
+        """
+        :return: (sxx, syy, sxy) about the means, or about zero when there is no intercept
+        """
+        if self.fit_intercept:
+            return self._cxx, self._cyy, self._cxy
+        n = self.n
+        return (self._cxx + n * self.mean_x * self.mean_x,
+                self._cyy + n * self.mean_y * self.mean_y,
+                self._cxy + n * self.mean_x * self.mean_y)
+
+    @property
+    def beta(self):
+        sxx, _, sxy = self._sums()
+        return sxy / sxx if self.n >= 2 and sxx > 0 else float('nan')
+
+    @property
+    def alpha(self):
+        if not self.fit_intercept:
+            return 0.0
+        beta = self.beta
+        return self.mean_y - beta * self.mean_x
+
+    @property
+    def zscore(self):
+        """
+        z-score of the latest residual among the window residuals (sample std, ddof=1).
+        """
+        beta = self.beta
+        if beta != beta:
+            return float('nan')
+        #spread s = y - beta * x: its mean and centred sum of squares follow from the window moments
+        var = (self._cyy - 2.0 * beta * self._cxy + beta * beta * self._cxx) / (self.n - 1)
+        if var <= 0:
+            return float('nan')
+        spread = self.y - beta * self.x
+        spread_mean = self.mean_y - beta * self.mean_x
+        return (spread - spread_mean) / math.sqrt(var)
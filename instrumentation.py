@@ -0,0 +1,212 @@
+import csv
+import json
+import time
+
+perf_counter_ns = time.perf_counter_ns
+
+class LatencyHistogram(object):
+    """
+    Low overhead latency histogram with power of 2 nanosecond buckets:
+    bucket b counts the samples in [2**(b-1), 2**b) ns.
+    Percentiles are reported as the upper bound of their bucket, so they are accurate within a factor of 2.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.buckets = [0] * 64
+        self.count = 0
+        self.total_ns = 0
+        self.max_ns = 0
+
+    def record(self, ns):
+        self.buckets[ns.bit_length()] += 1
+        self.count += 1
+        self.total_ns += ns
+        if ns > self.max_ns:
+            self.max_ns = ns
+
+    def percentile(self, q):
+        """
+        :param q: Percentile in [0, 100]
+        :return: upper bound (ns) of the bucket holding the q-th percentile
+        """
+        if not self.count:
+            return 0
+        target = q / 100.0 * self.count
+        seen = 0
+        for b, n in enumerate(self.buckets):
+            seen += n
+            if n and seen >= target:
+                return min(2 ** b, self.max_ns)
+        return self.max_ns
+
+    def summary(self):
+        return {
+            "name": self.name,
+            "count": self.count,
+            "total_ms": self.total_ns / 1e6,
+            "mean_us": self.total_ns / self.count / 1e3 if self.count else 0.0,
+            "p50_us": self.percentile(50) / 1e3,
+            "p90_us": self.percentile(90) / 1e3,
+            "p99_us": self.percentile(99) / 1e3,
+            "max_us": self.max_ns / 1e3,
+        }
+
+
+class Instrumentation(object):
+    """
+    Hot path instrumentation of the event loop: latency histograms per event type and per handler,
+    bars and events counters, and event queue depth sampled before every event taken off the queue.
+    Enabled with Backtest(instrument=True).
+    """
+
+    enabled = True
+
+    def __init__(self):
+        self.histograms = {}
+        self.bars = 0
+        self.queue_depth_max = 0
+        self.queue_depth_total = 0
+        self.queue_depth_samples = 0
+        self.started_ns = None
+        self.finished_ns = None
+
+    def histogram(self, name):
+        if name not in self.histograms:
+            self.histograms[name] = LatencyHistogram(name)
+        return self.histograms[name]
+
+    def start(self):
+        self.started_ns = perf_counter_ns()
+
+    def stop(self):
+        self.finished_ns = perf_counter_ns()
+
+    def record_queue_depth(self, depth):
+        self.queue_depth_samples += 1
+        self.queue_depth_total += depth
+        if depth > self.queue_depth_max:
+            self.queue_depth_max = depth
+
+    def instrument_dispatcher(self, dispatcher):
+        """
+        Times the handlers of an EventDispatcher, recording the whole event (histogram '<EventClass>')
+        and each handler ('<EventClass>.<handler>'). The registrations are left as they are: the dispatcher
+        wraps the handlers it resolves (see wrap_handlers), so handlers registered later are timed as well.
+        """
+        dispatcher.wrap = self.wrap_handlers
+        dispatcher.handlers.clear()
+
+    def wrap_handlers(self, event_cls, handlers):
+        """
+        :return: a one handler list calling handlers with their latency recorded.
+                 A handler method registered more than once (ex. the calc_signals of several strategies)
+                 gets one histogram per owner, named '<Owner>[<strategy_id>].<method>' when the owner has a
+                 strategy_id, else '<Owner>[<n>].<method>' with n its rank among them in registration order.
+        """
+        if not handlers:
+            return handlers
+        names = [_handler_name(h) for h in handlers]
+        seen = {}
+        timed = []
+        for name, handler in zip(names, handlers):
+            if names.count(name) > 1:
+                seen[name] = seen.get(name, 0) + 1
+                name = _handler_name(handler, getattr(getattr(handler, "__self__", None), "strategy_id", seen[name]))
+            timed.append((self.histogram("%s.%s" % (event_cls.__name__, name)), handler))
+        event_hist = self.histogram(event_cls.__name__)
+
+        def handle(event):
+            start = perf_counter_ns()
+            for hist, handler in timed:
+                t0 = perf_counter_ns()
+                handler(event)
+                hist.record(perf_counter_ns() - t0)
+            event_hist.record(perf_counter_ns() - start)
+        return [handle]
+
+    def timed(self, name, handler):
+        """
+        :return: handler wrapped to record its latency in histogram name,
+                 for handlers called by a dispatched handler (ex. a router) rather than by the dispatcher
+        """
+        hist = self.histogram(name)
+
+        def timed_handler(event):
+            t0 = perf_counter_ns()
+            handler(event)
+            hist.record(perf_counter_ns() - t0)
+        return timed_handler
+
+    def report(self, event_names=("MarketEvent", "SignalEvent", "OrderEvent", "FillEvent")):
+        """
+        :return: dict of counters, throughput and histogram summaries
+        """
+        end = self.finished_ns or perf_counter_ns()
+        elapsed = (end - self.started_ns) / 1e9 if self.started_ns else 0.0
+        events = sum(self.histograms[n].count for n in event_names if n in self.histograms)
+        return {
+            "elapsed_s": elapsed,
+            "bars": self.bars,
+            "events": events,
+            "bars_per_s": self.bars / elapsed if elapsed else 0.0,
+            "events_per_s": events / elapsed if elapsed else 0.0,
+            "queue_depth_max": self.queue_depth_max,
+            "queue_depth_mean": self.queue_depth_total / self.queue_depth_samples if self.queue_depth_samples else 0.0,
+            "histograms": [h.summary() for h in self.histograms.values()],
+        }
+
+    def export(self, path):
+        """
+        Writes the report as JSON, or as CSV (one row per histogram, counters as extra rows) if path ends in .csv
+        """
+        report = self.report()
+        if path.endswith(".csv"):
+            fields = ["name", "count", "total_ms", "mean_us", "p50_us", "p90_us", "p99_us", "max_us"]
+            with open(path, "w", newline="") as f:
+                writer = csv.DictWriter(f, fieldnames=fields)
+                writer.writeheader()
+                for row in report["histograms"]:
+                    writer.writerow(row)
+                for key, value in report.items():
+                    if key != "histograms":
+                        writer.writerow({"name": key, "count": value})
+        else:
+            with open(path, "w") as f:
+                json.dump(report, f, indent=2)
+
+
+class NullInstrumentation(object):
+    """
+    Disabled instrumentation, every hook is a no-op and handlers are left untouched.
+    """
+
+    enabled = False
+
+    def instrument_dispatcher(self, dispatcher):
+        pass
+
+    def timed(self, name, handler):
+        return handler
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def report(self):
+        return {}
+
+    def export(self, path):
+        pass
+
+
+def _handler_name(handler, rank=None):
+    owner = getattr(handler, "__self__", None)
+    name = getattr(handler, "__name__", repr(handler))
+    if owner is None:
+        return name if rank is None else "%s[%s]" % (name, rank)
+    if rank is None:
+        return "%s.%s" % (type(owner).__name__, name)
+    return "%s[%s].%s" % (type(owner).__name__, rank, name)
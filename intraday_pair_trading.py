@@ -1,13 +1,191 @@
 import datetime
+import functools
+import os
+from contextlib import redirect_stdout
+
 import numpy as np
-import pandas as pd
-import statsmodels.api as sm
 
 from strategy import Strategy
 from event import SignalEvent
+from eventbus import EventQueue
+from indicators import RollingOLS
 from backtest import Backtest
-from hft_data import HistoricCSVDataHandlerHFT
-from hft_portfolio import PortfolioHFT
+from data import HistoricMinDataHandler, HistoricMinArrayDataHandler
 from execution import SimulatedExecutionHandler
+from portfolio import Portfolio
 
 class IntradayOLSMRStrategy(Strategy):
+    """
+    Intraday mean reversion pairs strategy.
+    The hedge ratio of each pair (y on x) is a rolling OLS over the last ols_window closes,
+    and the spread y - hedge_ratio * x is traded on its z-score within that window:
+    long the spread (LONG y, SHORT x) below -zscore_high, short it above zscore_high,
+    and both legs are exited once |z-score| falls under zscore_low.
+
+    The regression is a RollingOLS updated once per bar, O(1) whatever the window,
+    instead of refitting statsmodels OLS on the whole window every minute.
+    The x leg is signalled with strength = |hedge ratio|, so the portfolio can size it against the y leg,
+    and its direction is flipped when the hedge ratio is negative.
+    """
+    def __init__(self, bars, events, ols_window=100, zscore_low=0.5, zscore_high=3.0, pairs=None,
+                 fit_intercept=False, base_quantity=1):
+        """
+        Initialises the pairs strategy.
+        :param bars: The DataHandler object that provides bar information
+        :param events: The Event Queue object
+        :param ols_window: The lookback of the rolling regression
+        :param zscore_low: Exit threshold of the spread z-score
+        :param zscore_high: Entry threshold of the spread z-score
+        :param pairs: List of (y symbol, x symbol), defaults to the first two symbols of the DataHandler
+        :param fit_intercept: If False, y = hedge_ratio * x as the original sm.OLS(y, x) fit
+        :param base_quantity: The base_quantity of the Portfolio, a pair is not entered when its x leg rounds to 0 shares
+        """
+        self.bars = bars
+        self.symbol_list = self.bars.symbol_list
+        self.events = events
+        self.ols_window = ols_window
+        self.zscore_low = zscore_low
+        self.zscore_high = zscore_high
+        self.base_quantity = base_quantity
+        self.max_lookback = 1 #only the latest closes are pulled, the regression is updated incrementally
+
+        self.pairs = [tuple(p) for p in pairs] if pairs is not None else [tuple(self.symbol_list[:2])]
+        self.ols = dict((p, RollingOLS(ols_window, fit_intercept)) for p in self.pairs)
+        self.invested = dict((p, 'OUT') for p in self.pairs) #'OUT', 'LONG' (spread) or 'SHORT' (spread)
+        self.hedge_ratio = dict((p, float('nan')) for p in self.pairs)
+        self.zscore = dict((p, float('nan')) for p in self.pairs)
+
+    def _put_pair(self, pair, y_signal, x_signal, hedge_ratio, y_price, x_price):
+        dt = datetime.datetime.utcnow()
+        self.events.put(SignalEvent(self.strategy_id, pair[0], dt, y_signal, 1.0, y_price))
+        self.events.put(SignalEvent(self.strategy_id, pair[1], dt, x_signal, hedge_ratio, x_price))
+
+    def _enter_pair(self, pair, y_signal, hedge_ratio, y_price, x_price):
+        """
+        Opens both legs, the x leg against the y leg unless the hedge ratio is negative.
+        :return: True if entered, False if the x leg would round to no shares (the y leg would be left unhedged)
+        """
+        opposite = {'LONG': 'SHORT', 'SHORT': 'LONG'}
+        x_signal = opposite[y_signal] if hedge_ratio >= 0 else y_signal
+        if int(round(self.base_quantity * abs(hedge_ratio))) <= 0:
+            if self.verbose:
+                print("SKIP %s SPREAD %s/%s: hedge ratio %.4f rounds to 0 shares of %s" % (
+                    y_signal, pair[0], pair[1], hedge_ratio, pair[1]))
+            return False
+        self._put_pair(pair, y_signal, x_signal, abs(hedge_ratio), y_price, x_price)
+        return True
+
+    def calc_signals(self, event):
+        """
+        Updates the regression of every pair with the latest closes and generates paired signals
+        when the spread z-score crosses the thresholds.
+        :param event: A MarketEvent Object
+        """
+        if event.type == 'MARKET':
+            for pair in self.pairs:
+                y_price = self.bars.get_latest_bar_value(pair[0], 'close')
+                x_price = self.bars.get_latest_bar_value(pair[1], 'close')
+                ols = self.ols[pair]
+                hedge_ratio = ols.update(x_price, y_price)
+                if ols.count < self.ols_window:
+                    continue
+                zscore = ols.zscore
+                self.hedge_ratio[pair] = hedge_ratio
+                self.zscore[pair] = zscore
+                if zscore != zscore:
+                    continue
+
+                if self.invested[pair] == 'OUT':
+                    if zscore <= -self.zscore_high:
+                        if self._enter_pair(pair, 'LONG', hedge_ratio, y_price, x_price):
+                            if self.verbose:
+                                print("LONG SPREAD %s/%s: %s" % (pair + (self.bars.get_latest_bar_datetime(pair[0]),)))
+                            self.invested[pair] = 'LONG'
+                    elif zscore >= self.zscore_high:
+                        if self._enter_pair(pair, 'SHORT', hedge_ratio, y_price, x_price):
+                            if self.verbose:
+                                print("SHORT SPREAD %s/%s: %s" % (pair + (self.bars.get_latest_bar_datetime(pair[0]),)))
+                            self.invested[pair] = 'SHORT'
+                elif abs(zscore) <= self.zscore_low:
+                    if self.verbose:
+                        print("EXIT SPREAD %s/%s: %s" % (pair + (self.bars.get_latest_bar_datetime(pair[0]),)))
+                    self._put_pair(pair, 'EXIT', 'EXIT', 1.0, y_price, x_price)
+                    self.invested[pair] = 'OUT'
+
+
+def batch_ols_zscores(x, y, window, fit_intercept=False):
+    """
+    Reference implementation: refits OLS on each full window with np.linalg.lstsq and computes the z-score
+    of the latest residual, as the original statsmodels version did. O(window) per bar, for checks only.
+    :param x: Array of x closes
+    :param y: Array of y closes
+    :return: (hedge_ratio, zscore) arrays, NaN until the window is full
+    """
+    n = len(x)
+    hedge_ratio = np.full(n, np.nan)
+    zscore = np.full(n, np.nan)
+    for t in range(window - 1, n):
+        xs, ys = x[t - window + 1:t + 1], y[t - window + 1:t + 1]
+        design = np.column_stack((xs, np.ones(window))) if fit_intercept else xs[:, None]
+        beta = np.linalg.lstsq(design, ys, rcond=None)[0][0]
+        spread = ys - beta * xs
+        hedge_ratio[t] = beta
+        zscore[t] = (spread[-1] - spread.mean()) / spread.std(ddof=1)
+    return hedge_ratio, zscore
+
+def compare_with_batch_ols(csv_dir, pair, ols_window=100, fit_intercept=False, rtol=1e-6):
+    """
+    Check harness: steps IntradayOLSMRStrategy over the data and compares its incremental hedge ratio
+    and z-score on every bar with a batch OLS refit of the same window.
+    Bars where either symbol has no close yet are left out, as the strategy skips them.
+    :param pair: (y symbol, x symbol)
+    :return: dict with 'match', 'max_hedge_ratio_diff', 'max_zscore_diff' and 'bars' compared
+    """
+    events = EventQueue()
+    with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+        bars = HistoricMinArrayDataHandler(events, csv_dir, list(pair))
+        strategy = IntradayOLSMRStrategy(bars, events, ols_window=ols_window, pairs=[pair],
+                                         fit_intercept=fit_intercept)
+        strategy.verbose = False
+
+        incremental = np.full((bars.n_bars, 2), np.nan)
+        while True:
+            bars.update_bars()
+            if not bars.continue_backtest: #the closing MarketEvent repeats the last bar
+                break
+            strategy.calc_signals(events.get(False))
+            events.clear()
+            incremental[bars.cursor - 1] = strategy.hedge_ratio[pair], strategy.zscore[pair]
+
+    y = bars.symbol_columns[pair[0]]['close']
+    x = bars.symbol_columns[pair[1]]['close']
+    valid = (x == x) & (y == y)
+    batch_beta, batch_z = batch_ols_zscores(x[valid], y[valid], ols_window, fit_intercept)
+    beta, z = incremental[valid, 0], incremental[valid, 1]
+
+    beta_match = np.allclose(beta, batch_beta, rtol=rtol, atol=0.0, equal_nan=True)
+    z_match = np.allclose(z, batch_z, rtol=rtol, atol=rtol, equal_nan=True)
+    with np.errstate(invalid='ignore'):
+        return {
+            'match': bool(beta_match and z_match),
+            'max_hedge_ratio_diff': np.nanmax(np.abs(beta - batch_beta)) if valid.any() else 0.0,
+            'max_zscore_diff': np.nanmax(np.abs(z - batch_z)) if valid.any() else 0.0,
+            'bars': int(valid.sum()),
+        }
+
+
+if __name__ == "__main__":
+    csv_dir = 'G:/공유 드라이브/Project_TBD/Stock_Data/Minute/'
+    symbol_list = ["005930", "000660"]
+    initial_cap = 1000000.0
+    heartbeat = 0.0
+    start_date = datetime.datetime(2019, 11, 1, 9, 0, 0)
+
+    print(compare_with_batch_ols(csv_dir, tuple(symbol_list)))
+
+    backtest = Backtest(
+        csv_dir, symbol_list, initial_cap, heartbeat, start_date,
+        HistoricMinDataHandler, SimulatedExecutionHandler, functools.partial(Portfolio, base_quantity=100),
+        functools.partial(IntradayOLSMRStrategy, base_quantity=100)
+    )
+    backtest.simulate_trading()
@@ -0,0 +1,156 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+MAGIC = b"TBDJOURNAL1\n"
+
+KINDS = {"SIGNAL": 1, "ORDER": 2, "FILL": 3}
+CODES = {"LONG": 1, "SHORT": 2, "EXIT": 3, "MKT": 4, "LMT": 5, "CANCEL": 6}
+DIRECTIONS = {"BUY": 1, "SELL": -1}
+
+def record_dtype(symbol_width=16):
+    """
+    :param symbol_width: Bytes of the symbol field (UTF-8)
+    :return: the structured dtype of a journal record
+    """
+    return np.dtype([
+        ("bar_time", "<i8"),        #bar datetime in ns since epoch
+        ("kind", "u1"),             #KINDS
+        ("code", "u1"),             #signal_type (SIGNAL) or order_type (ORDER), CODES
+        ("direction", "i1"),        #DIRECTIONS (ORDER, FILL)
+        ("strategy_id", "<i4"),     #-1 when the event has none
+        ("symbol", "S%d" % symbol_width),
+        ("quantity", "<i8"),
+        ("price", "<f8"),           #cur_price (SIGNAL), est_fill_cost (ORDER), fill_cost (FILL)
+        ("est_fill_cost", "<f8"),
+        ("commission", "<f8"),
+        ("strength", "<f8"),
+    ])
+
+RECORD_DTYPE = record_dtype()
+
+class EventJournal(object):
+    """
+    Appends compact fixed size binary records of every signal/order/fill to a file.
+    Records are buffered in a preallocated NumPy structured array and written in batches,
+    so no I/O happens per event. Load it back with read_journal().
+    """
+
+    def __init__(self, path, batch_size=4096, symbol_list=None, resume_records=None):
+        """
+        :param path: Journal file, overwritten unless resume_records is given
+        :param batch_size: Number of records buffered between writes
+        :param symbol_list: Symbols journaled, the symbol field is widened to the longest (16 bytes at least)
+        :param resume_records: Reopens the journal at path, keeping its first resume_records records
+                               (those written before a checkpoint) and appending after them
+        """
+        self.path = path
+        self.symbol_width = max([16] + [len(str(s).encode()) for s in symbol_list or ()])
+        if resume_records is None:
+            dtype = record_dtype(self.symbol_width)
+            self.file = open(path, "wb")
+            self.file.write(MAGIC + json.dumps(dtype.descr).encode() + b"\n")
+            self.written = 0
+        else:
+            self.file = open(path, "r+b")
+            dtype = _read_header(self.file, path)
+            if dtype["symbol"].itemsize < self.symbol_width:
+                raise ValueError("Symbol field of %s is narrower than the symbols journaled" % path)
+            self.symbol_width = dtype["symbol"].itemsize
+            end = self.file.tell() + resume_records * dtype.itemsize
+            if os.fstat(self.file.fileno()).st_size < end:
+                raise ValueError("%s holds fewer than the %d records to resume from" % (path, resume_records))
+            self.file.truncate(end) #records after the checkpoint are journaled again by the resumed run
+            self.file.seek(end)
+            self.written = resume_records
+        self.buffer = np.zeros(batch_size, dtype=dtype)
+        self.n = 0
+
+    def record(self, event, bar_time):
+        """
+        Buffers a SignalEvent, OrderEvent or FillEvent.
+        :param event: The event
+        :param bar_time: Datetime of the bar being processed
+        """
+        symbol = str(event.symbol).encode()
+        if len(symbol) > self.symbol_width:
+            raise ValueError("Symbol %s is longer than the %d bytes of the journal, pass it in symbol_list"
+                             % (event.symbol, self.symbol_width))
+        if self.n == self.buffer.shape[0]:
+            self.flush()
+        row = self.buffer[self.n]
+        row["bar_time"] = pd.Timestamp(bar_time).value if bar_time is not None else 0
+        row["symbol"] = symbol
+        row["strategy_id"] = -1 if event.strategy_id is None else event.strategy_id
+        row["direction"] = 0
+        row["code"] = 0
+        row["commission"] = row["strength"] = row["est_fill_cost"] = np.nan
+
+        if event.type == "SIGNAL":
+            row["kind"] = KINDS["SIGNAL"]
+            row["code"] = CODES.get(event.signal_type, 0)
+            row["quantity"] = 0
+            row["price"] = event.cur_price
+            row["strength"] = event.strength
+        elif event.type == "ORDER":
+            row["kind"] = KINDS["ORDER"]
+            row["code"] = CODES.get(event.order_type, 0)
+            row["direction"] = DIRECTIONS.get(event.direction, 0)
+            row["quantity"] = event.quantity
+            row["price"] = row["est_fill_cost"] = event.est_fill_cost
+        elif event.type == "FILL":
+            row["kind"] = KINDS["FILL"]
+            row["direction"] = DIRECTIONS.get(event.direction, 0)
+            row["quantity"] = event.quantity
+            row["price"] = np.nan if event.fill_cost is None else event.fill_cost
+            row["est_fill_cost"] = np.nan if event.est_fill_cost is None else event.est_fill_cost
+            row["commission"] = event.commission
+        else:
+            return
+        self.n += 1
+
+    def flush(self):
+        """
+        Writes the buffered records.
+        """
+        if self.n:
+            self.file.write(self.buffer[:self.n].tobytes())
+            self.written += self.n
+            self.n = 0
+        self.file.flush()
+
+    def close(self):
+        if not self.file.closed:
+            self.flush()
+            self.file.close()
+
+
+def _read_header(f, path):
+    """
+    Reads the header of a journal opened in binary mode, leaving f at the first record.
+    :return: the record dtype
+    """
+    if f.read(len(MAGIC)) != MAGIC:
+        raise ValueError("%s is not an event journal" % path)
+    descr = json.loads(f.readline())
+    return np.dtype([tuple(field) for field in descr])
+
+def read_journal(path):
+    """
+    Loads an event journal into a DataFrame, one row per signal/order/fill in processing order.
+    :param path: Journal file written by EventJournal
+    :return: pandas DataFrame with bar_time as datetime and kind/code/direction/symbol decoded to strings
+    """
+    with open(path, "rb") as f:
+        dtype = _read_header(f, path)
+        records = np.fromfile(f, dtype=dtype)
+
+    frame = pd.DataFrame({name: records[name] for name in dtype.names})
+    frame["bar_time"] = pd.to_datetime(frame["bar_time"])
+    frame["symbol"] = frame["symbol"].str.decode("utf-8")
+    frame["kind"] = frame["kind"].map(dict((v, k) for k, v in KINDS.items()))
+    frame["code"] = frame["code"].map(dict((v, k) for k, v in CODES.items()))
+    frame["direction"] = frame["direction"].map({1: "BUY", -1: "SELL", 0: None})
+    return frame
@@ -0,0 +1,356 @@
+"""
+Live trading path over a socket, and a local replay feed server standing in for the broker.
+
+Protocol: newline delimited JSON messages
+    server -> client {"msg": "bar", "datetime": iso, "bars": {symbol: {close: .., ...} or null}, "sent_ns": ..}
+                     {"msg": "fill", "order_id": .., "symbol": .., "quantity": .., "direction": .., "fill_cost": ..,
+                      "datetime": iso}
+                     {"msg": "end"} once every bar has been sent
+    client -> server {"msg": "order", "order_id": .., "symbol": .., "order_type": .., "quantity": ..,
+                      "direction": .., "est_fill_cost": ..}
+                     {"msg": "ready"} once a bar and the orders it triggered are handled
+                     {"msg": "bye"} once the client has seen "end", the server then closes the connection
+In lockstep mode the server waits for "ready" before sending the next bar, so every fill arrives before
+the next bar, as in the backtest. Otherwise bars are pushed regardless of the client, as a real feed does.
+"""
+import asyncio
+import itertools
+import json
+import os, os.path
+import time
+
+import numpy as np
+import pandas as pd
+
+from alignment import align_bar_streams
+from csvcache import read_minute_csv
+from data import HistoricMinDataHandler
+from event import MarketEvent, SignalEvent, OrderEvent, FillEvent
+from eventbus import EventQueue, EventDispatcher
+from execution import ExecutionHandler
+
+def _encode(msg):
+    return (json.dumps(msg) + "\n").encode()
+
+def replay_bar_slices(csv_dir, symbol_list):
+    """
+    Reads the historic minute CSVs and yields them as aligned (datetime, {symbol: bar dict}) slices.
+    Before its first bar, a symbol's bar is all NaN, as in HistoricMinDataHandler.
+    """
+    streams = {}
+    empty_bars = {}
+    for s in symbol_list:
+        frame = read_minute_csv(os.path.join(csv_dir, "%s_minute_prac.csv" % s))
+        columns = [str(c) for c in frame.columns]
+        streams[s] = ((ts, dict(zip(columns, row)))
+                      for ts, row in zip(frame.index, frame.itertuples(index=False, name=None)))
+        empty_bars[s] = dict.fromkeys(columns, float("nan"))
+    return align_bar_streams(streams, empty_bars)
+
+
+class ReplayFeedServer(object):
+    """
+    Local replay server streaming the historic CSV bars over the live protocol,
+    and filling the orders it receives at the last close sent, as SimulatedExecutionHandler does.
+    Serves one client connection at a time.
+    """
+
+    def __init__(self, csv_dir, symbol_list, speed=None, lockstep=False, host="127.0.0.1", port=0):
+        """
+        :param csv_dir: Absolute directory path to CSV files.
+        :param symbol_list: A list of symbol strings.
+        :param speed: Replay speed as a multiple of real time (60.0 plays a minute bar every second),
+                      None streams as fast as the connection allows
+        :param lockstep: If True, waits for the client to handle each bar before sending the next one
+        :param host: Interface to listen on
+        :param port: Port to listen on, 0 picks a free one (see self.port once started)
+        """
+        self.csv_dir = csv_dir
+        self.symbol_list = symbol_list
+        self.speed = speed
+        self.lockstep = lockstep
+        self.host = host
+        self.port = port
+        self.server = None
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._handle_client, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    async def close(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def _handle_client(self, reader, writer):
+        last_close = {}
+        ready = asyncio.Queue()
+        feed = asyncio.ensure_future(self._feed(writer, last_close, ready))
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                msg = json.loads(line)
+                if msg["msg"] == "order":
+                    writer.write(_encode(self._fill(msg, last_close)))
+                elif msg["msg"] == "ready":
+                    if self.lockstep:
+                        ready.put_nowait(True)
+                elif msg["msg"] == "bye":
+                    break
+            await feed
+            await writer.drain()
+        finally:
+            feed.cancel()
+            writer.close()
+
+    def _fill(self, order, last_close):
+        """
+        Fills the whole order at the last close sent for its symbol.
+        """
+        dt, close = last_close[order["symbol"]]
+        return {
+            "msg": "fill", "order_id": order["order_id"], "symbol": order["symbol"],
+            "quantity": order["quantity"], "direction": order["direction"],
+            "fill_cost": close * order["quantity"], "datetime": dt,
+        }
+
+    async def _feed(self, writer, last_close, ready):
+        previous = None
+        for timestamp, latest in replay_bar_slices(self.csv_dir, self.symbol_list):
+            if self.speed and previous is not None:
+                await asyncio.sleep((timestamp - previous).total_seconds() / self.speed)
+            previous = timestamp
+
+            dt = timestamp.isoformat()
+            for s, bar in latest.items():
+                last_close[s] = (dt, bar["close"])
+            writer.write(_encode({"msg": "bar", "datetime": dt, "bars": latest, "sent_ns": time.time_ns()}))
+            await writer.drain()
+            if self.lockstep:
+                await ready.get()
+            else:
+                await asyncio.sleep(0) #lets the order reader run between bars
+        writer.write(_encode({"msg": "end"}))
+        await writer.drain()
+
+
+class LiveMinDataHandler(HistoricMinDataHandler):
+    """
+    LiveMinDataHandler keeps the latest bars received from a live feed, with the same interface
+    (bounded lookback, indicators) as HistoricMinDataHandler, so strategies and portfolios run unchanged.
+    Bars are pushed by LiveTrading with push_bars() and then released by update_bars(), one slice at a time.
+    """
+
+    def __init__(self, events, symbol_list, max_lookback=None):
+        """
+        :param events: The event queue
+        :param symbol_list: A list of symbol strings.
+        :param max_lookback: Max number of bars kept per symbol, None keeps the whole history
+        """
+        self._pending = []
+        super(LiveMinDataHandler, self).__init__(events, None, symbol_list, max_lookback)
+
+    def _open_convert_csv_files(self):
+        """
+        Nothing to open, bars arrive from the feed.
+        """
+        for s in self.symbol_list:
+            self.latest_symbol_data[s] = []
+
+    def push_bars(self, timestamp, bars):
+        """
+        Queues a slice received from the feed.
+        :param timestamp: Datetime of the slice
+        :param bars: dict of symbol -> dict of values, or None if the symbol has no bar yet
+        """
+        self._pending.append((timestamp, bars))
+
+    def _get_new_bars(self):
+        timestamp, bars = self._pending.pop(0)
+        latest = {}
+        for s in self.symbol_list:
+            bar = bars.get(s)
+            latest[s] = None if bar is None else pd.Series(bar, dtype=np.float64)
+        return timestamp, latest
+
+
+class SocketExecutionHandler(ExecutionHandler):
+    """
+    Sends Order events over the live protocol. Fills come back asynchronously and are put
+    on the event queue by LiveTrading.
+    """
+
+    def __init__(self, events, writer=None):
+        """
+        :param events: The Queue of Event objects.
+        :param writer: asyncio StreamWriter of the connection, set by LiveTrading
+        """
+        self.events = events
+        self.writer = writer
+        self.order_ids = itertools.count(1)
+        self.sent_ns = {} #order_id -> time the order was written
+
+    def execute_order(self, event):
+        if event.type == "ORDER":
+            order_id = next(self.order_ids)
+            self.writer.write(_encode({
+                "msg": "order", "order_id": order_id, "symbol": event.symbol, "order_type": event.order_type,
+                "quantity": event.quantity, "direction": event.direction, "est_fill_cost": event.est_fill_cost,
+            }))
+            self.sent_ns[order_id] = time.time_ns()
+
+
+class LatencyStats(object):
+    """
+    Collects the latencies (ns) of the live pipeline and summarises them.
+    feed: bar sent by the server -> received by the client
+    bar_to_order: bar received -> order written, for bars producing orders
+    order_to_fill: order written -> fill received
+    """
+
+    def __init__(self):
+        self.samples = {"feed": [], "bar_to_order": [], "order_to_fill": []}
+        self.bars = 0
+        self.orders = 0
+        self.fills = 0
+        self.started = None
+        self.finished = None
+
+    def summary(self):
+        """
+        :return: dict of throughput and per stage latency percentiles in microseconds
+        """
+        elapsed = (self.finished or time.perf_counter()) - (self.started or time.perf_counter())
+        out = {
+            "bars": self.bars, "orders": self.orders, "fills": self.fills, "elapsed_s": elapsed,
+            "bars_per_s": self.bars / elapsed if elapsed > 0 else float("nan"),
+        }
+        for name, values in self.samples.items():
+            if values:
+                us = np.asarray(values, dtype=np.float64) / 1e3
+                out[name + "_us"] = dict(zip(("p50", "p90", "p99", "max"), np.percentile(us, [50, 90, 99, 100])))
+        return out
+
+
+class LiveTrading(object):
+    """
+    Runs a strategy and portfolio against a live feed over the socket protocol, on an asyncio loop.
+    Events are dispatched exactly as in Backtest, only bars and fills come from the connection.
+    """
+
+    def __init__(self, host, port, symbol_list, initial_cap, start_date, portfolio, strategy,
+                 data_handler=LiveMinDataHandler, execution_handler=SocketExecutionHandler):
+        """
+        :param host: Feed server host
+        :param port: Feed server port
+        :param symbol_list: The list of symbol strings
+        :param initial_cap: The starting capital of portfolio
+        :param start_date: The start datetime of strategy
+        :param portfolio: (Class) Portfolio
+        :param strategy: (Class) Strategy
+        :param data_handler: (Class) Live data handler taking (events, symbol_list)
+        :param execution_handler: (Class) Execution handler taking (events)
+        """
+        self.host = host
+        self.port = port
+        self.symbol_list = symbol_list
+
+        #All handlers run on the event loop thread, so the deque based queue is enough
+        self.events = EventQueue()
+        self.dispatcher = EventDispatcher()
+        self.stats = LatencyStats()
+
+        self.data_handler = data_handler(self.events, symbol_list)
+        self.strategy = strategy(self.data_handler, self.events)
+        self.data_handler.set_max_lookback(self.strategy.max_lookback)
+        self.portfolio = portfolio(self.data_handler, self.events, start_date, initial_cap)
+        self.execution_handler = execution_handler(self.events)
+
+        self.dispatcher.register(MarketEvent, self.strategy.calc_signals)
+        self.dispatcher.register(MarketEvent, self.portfolio.update_timeindex)
+        self.dispatcher.register(SignalEvent, self.portfolio.update_signal)
+        self.dispatcher.register(OrderEvent, self.execution_handler.execute_order)
+        self.dispatcher.register(FillEvent, self.portfolio.update_fill)
+
+    def _on_bar(self, msg, received_ns):
+        self.stats.bars += 1
+        self.stats.samples["feed"].append(received_ns - msg["sent_ns"])
+
+        orders_before = len(self.execution_handler.sent_ns)
+        self.data_handler.push_bars(pd.Timestamp(msg["datetime"]), msg["bars"])
+        self.data_handler.update_bars()
+        self.dispatcher.drain(self.events)
+
+        sent = self.execution_handler.sent_ns
+        for order_id in range(orders_before + 1, len(sent) + 1):
+            self.stats.orders += 1
+            self.stats.samples["bar_to_order"].append(sent[order_id] - received_ns)
+
+    def _on_fill(self, msg, received_ns):
+        self.stats.fills += 1
+        self.stats.samples["order_to_fill"].append(received_ns - self.execution_handler.sent_ns[msg["order_id"]])
+        self.events.put(FillEvent(pd.Timestamp(msg["datetime"]), msg["symbol"], "REPLAY", msg["quantity"],
+                                  msg["direction"], msg["fill_cost"], None))
+        self.dispatcher.drain(self.events)
+
+    async def run(self):
+        """
+        Connects to the feed and trades until the server closes the connection.
+        :return: LatencyStats summary
+        """
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        self.execution_handler.writer = writer
+        self.stats.started = time.perf_counter()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                received_ns = time.time_ns()
+                msg = json.loads(line)
+                if msg["msg"] == "bar":
+                    self._on_bar(msg, received_ns)
+                    writer.write(_encode({"msg": "ready"}))
+                elif msg["msg"] == "fill":
+                    self._on_fill(msg, received_ns)
+                elif msg["msg"] == "end":
+                    self.data_handler.continue_backtest = False
+                    writer.write(_encode({"msg": "bye"}))
+                await writer.drain()
+        finally:
+            self.stats.finished = time.perf_counter()
+            writer.close()
+        return self.stats.summary()
+
+
+async def run_replay_session(csv_dir, symbol_list, initial_cap, start_date, portfolio, strategy, speed=None,
+                             lockstep=False):
+    """
+    Starts a local ReplayFeedServer and runs LiveTrading against it, to measure
+    end-to-end bar-to-order latency and throughput without a broker connection.
+    :param speed: Replay speed as a multiple of real time, None for as fast as possible
+    :param lockstep: If True, each bar waits for the previous one to be handled (backtest equivalent fills)
+    :return: (LiveTrading, LatencyStats summary)
+    """
+    server = await ReplayFeedServer(csv_dir, symbol_list, speed=speed, lockstep=lockstep).start()
+    try:
+        live = LiveTrading(server.host, server.port, symbol_list, initial_cap, start_date, portfolio, strategy)
+        summary = await live.run()
+    finally:
+        await server.close()
+    return live, summary
+
+
+if __name__ == "__main__":
+    import datetime
+    import pprint
+    from ma_strategy import MovingAverageCrossStrategy
+    from portfolio import Portfolio
+
+    live, summary = asyncio.run(run_replay_session(
+        'G:/공유 드라이브/Project_TBD/Stock_Data/Minute/', ["005930"], 1000000.0,
+        datetime.datetime(2019, 11, 1, 9, 0, 0), Portfolio, MovingAverageCrossStrategy
+    ))
+    pprint.pprint(summary)
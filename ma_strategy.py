@@ -2,10 +2,10 @@ import datetime
 
 import numpy as np
 import pandas as pd
-import statsmodels.api as sm
 
 from strategy import Strategy
 from event import SignalEvent
+from indicators import RollingMean
 from backtest import Backtest
 from data import HistoricMinDataHandler
 from execution import SimulatedExecutionHandler
@@ -15,6 +15,7 @@ class MovingAverageCrossStrategy(Strategy):
     """
     Carries out basic moving average strategy with a short/long simple weighted moving average.
     Default short/long window are 100/400 periods respectively.
+    The moving averages are incremental indicators updated by the DataHandler once per bar.
     """
     def __init__(self, bars, events, short_window=100, long_window=400):
         """
@@ -29,8 +30,16 @@ class MovingAverageCrossStrategy(Strategy):
         self.events = events
         self.short_window = short_window
         self.long_window = long_window
+        self.max_lookback = 1 #only the latest close is pulled, SMAs are updated incrementally
         self.bought = self._calculate_initial_bought()
 
+        #short SMA is taken over the last long_window bars at most, as np.mean(bars[-short_window:]) was
+        self.short_sma = {}
+        self.long_sma = {}
+        for s in self.symbol_list:
+            self.short_sma[s] = self.bars.add_indicator(s, 'close', RollingMean(min(short_window, long_window)))
+            self.long_sma[s] = self.bars.add_indicator(s, 'close', RollingMean(long_window))
+
     def _calculate_initial_bought(self):
         """
         Adds keys to the bought dict for all symbols and sets them to 'OUT'
@@ -51,28 +60,28 @@ class MovingAverageCrossStrategy(Strategy):
         """
         if event.type == 'MARKET':
             for s in self.symbol_list:
-                bars = self.bars.get_latest_n_bars_value(s, 'close', N=self.long_window)
-                bar_date = self.bars.get_latest_bar_datetime(s)
-                if (bars is not None) and (bars.size > 0):
-                    short_sma = np.mean(bars[-self.short_window:])
-                    long_sma = np.mean(bars[-self.long_window:])
+                if self.long_sma[s].count > 0:
+                    short_sma = self.short_sma[s].value
+                    long_sma = self.long_sma[s].value
 
                     symbol = s
                     dt = datetime.datetime.utcnow()
                     sig_dir = ""
 
                     if short_sma > long_sma and self.bought[s]=="OUT":
-                        print("LONG: %s" % bar_date)
+                        if self.verbose:
+                            print("LONG: %s" % self.bars.get_latest_bar_datetime(s))
                         sig_dir = "LONG"
                         cur_price = self.bars.get_latest_bar_value(s, 'close')
-                        signal = SignalEvent(1, symbol, dt, sig_dir, 1.0, cur_price)
+                        signal = SignalEvent(self.strategy_id, symbol, dt, sig_dir, 1.0, cur_price)
                         self.events.put(signal)
                         self.bought[s] = 'LONG'
                     elif short_sma < long_sma and self.bought[s]=="LONG":
-                        print("SHORT: %s" % bar_date)
+                        if self.verbose:
+                            print("SHORT: %s" % self.bars.get_latest_bar_datetime(s))
                         sig_dir = "EXIT"
                         cur_price = self.bars.get_latest_bar_value(s, 'close')
-                        signal = SignalEvent(1, symbol, dt, sig_dir, 1.0, cur_price)
+                        signal = SignalEvent(self.strategy_id, symbol, dt, sig_dir, 1.0, cur_price)
                         self.events.put(signal)
                         self.bought[s] = 'OUT'
 
@@ -0,0 +1,102 @@
+import heapq
+
+
+class RestingOrder(object):
+    """
+    A limit order waiting in an OrderBook.
+    """
+    __slots__ = ('order_id', 'symbol', 'direction', 'limit_price', 'quantity', 'remaining', 'strategy_id')
+
+    def __init__(self, order_id, symbol, direction, limit_price, quantity, strategy_id=None):
+        self.order_id = order_id
+        self.symbol = symbol
+        self.direction = direction
+        self.limit_price = limit_price
+        self.quantity = quantity
+        self.remaining = quantity
+        self.strategy_id = strategy_id
+
+
+class OrderBook(object):
+    """
+    Resting limit orders of one symbol, kept in two price sorted heaps.
+
+    Bids sit in a max-heap and asks in a min-heap, ordered by price and then arrival (price-time priority),
+    so matching a bar only looks at the top of each heap: O(log n) per order touched, whatever the book size.
+    Cancelled orders are only dropped from the orders dict and their heap entries are discarded
+    when they reach the top (lazy deletion), so cancels are O(1).
+    """
+
+    def __init__(self, symbol):
+        self.symbol = symbol
+        self.bids = [] #(-limit_price, seq, order_id)
+        self.asks = [] #(limit_price, seq, order_id)
+        self.orders = {} #order_id -> RestingOrder, live orders only
+        self._seq = 0 #arrival counter, breaks price ties
+
+    def __len__(self):
+        return len(self.orders)
+
+    def add(self, order):
+        """
+        :param order: A RestingOrder with direction "BUY" or "SELL"
+        """
+        if order.direction == "BUY":
+            heapq.heappush(self.bids, (-order.limit_price, self._seq, order.order_id))
+        elif order.direction == "SELL":
+            heapq.heappush(self.asks, (order.limit_price, self._seq, order.order_id))
+        else:
+            raise ValueError("Unknown order direction %s" % order.direction)
+        self._seq += 1
+        self.orders[order.order_id] = order
+
+    def cancel(self, order_id):
+        """
+        :return: the cancelled RestingOrder, None if it is not resting anymore (filled or already cancelled)
+        """
+        return self.orders.pop(order_id, None)
+
+    def _top(self, heap):
+        """
+        :return: the best live order of the heap, None if there is none. Stale entries on top are discarded.
+        """
+        while heap:
+            order = self.orders.get(heap[0][2])
+            if order is not None:
+                return order
+            heapq.heappop(heap)
+        return None
+
+    def match(self, open_price, high, low, max_quantity=None):
+        """
+        Matches the resting orders against one bar.
+        A buy is filled when the bar trades at or below its limit, a sell when it trades at or above it.
+        Orders are filled at their limit price, or at the open when the bar gaps through the limit.
+        :param max_quantity: Max total quantity filled on this bar (volume participation cap), None for no cap
+        :return: list of (RestingOrder, fill_quantity, fill_price). Fully filled orders leave the book.
+        """
+        fills = []
+        available = max_quantity
+        for heap, side in ((self.bids, 1), (self.asks, -1)):
+            while available is None or available > 0:
+                order = self._top(heap)
+                if order is None:
+                    break
+                if side == 1:
+                    if low > order.limit_price:
+                        break
+                    price = min(order.limit_price, open_price)
+                else:
+                    if high < order.limit_price:
+                        break
+                    price = max(order.limit_price, open_price)
+
+                quantity = order.remaining if available is None else min(order.remaining, available)
+                order.remaining -= quantity
+                if available is not None:
+                    available -= quantity
+                if order.remaining == 0:
+                    heapq.heappop(heap)
+                    del self.orders[order.order_id]
+                fills.append((order, quantity, price))
+        return fills
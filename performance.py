@@ -1,11 +1,12 @@
 import numpy as np
 import pandas as pd
 
-def create_sharpe_ratio(returns, periods="minutely"):
+MIN_DRAWDOWN = 1e-9 #below this, a max drawdown is floating point noise
+
+def periods_per_year(periods="minutely"):
     """
-    Create sharpe ration for the strategy, based on a benchmark of zero
-    :param returns: A pandas series representing period percentage returns.
     :param periods: Daily - 252, Hourly - 252*6.5, Minutely -252*6.5*60(한국시장은 3시 20분부터 동시호가로 갯수로는 382개 모임)
+    :return: number of periods in a year
     """
     n = None
     if periods == "daily":
@@ -16,31 +17,133 @@ def create_sharpe_ratio(returns, periods="minutely"):
         n = 252*6.5*60
     else:
         print("put correct periods for sharpe ratio")
+    return n
 
+def create_sharpe_ratio(returns, periods="minutely"):
+    """
+    Create sharpe ration for the strategy, based on a benchmark of zero
+    :param returns: A pandas series representing period percentage returns.
+    :param periods: Daily - 252, Hourly - 252*6.5, Minutely -252*6.5*60(한국시장은 3시 20분부터 동시호가로 갯수로는 382개 모임)
+    """
+    n = periods_per_year(periods)
     return np.sqrt(n) * (np.mean(returns) / np.std(returns))
 
+def create_sortino_ratio(returns, periods="minutely"):
+    """
+    Create sortino ratio for the strategy, based on a benchmark of zero.
+    Only the downside deviation (negative returns) is penalised.
+    :param returns: A pandas series or NumPy array representing period percentage returns.
+    :param periods: Daily, Hourly, Minutely (see periods_per_year)
+    """
+    r = np.asarray(returns, dtype=np.float64)
+    r = r[~np.isnan(r)]
+    if not r.size:
+        return np.nan
+    downside = np.sqrt(np.mean(np.minimum(r, 0.0) ** 2))
+    if not downside:
+        return np.nan
+    return np.sqrt(periods_per_year(periods)) * (np.mean(r) / downside)
+
+def _ffill(values):
+    """
+    Forward fills NaNs of a 1-D array (leading NaNs stay NaN), like pandas pct_change's default padding.
+    """
+    idx = np.where(np.isnan(values), 0, np.arange(values.size))
+    np.maximum.accumulate(idx, out=idx)
+    return values[idx]
+
+def _drawdown_arrays(pnl):
+    """
+    Percentage drawdown and its duration (bars since the last high water mark) of an equity curve,
+    using a cumulative max and a running index of the last bar at the high water mark.
+    Leading NaNs (ex. the first bar of a pct_change based curve) are ignored.
+    """
+    pnl = np.asarray(pnl, dtype=np.float64)
+    hwm = np.fmax.accumulate(pnl)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        drawdown = 1.0 - pnl / hwm
+
+    idx = np.arange(pnl.size)
+    underwater = drawdown > 0
+    last_peak = np.maximum.accumulate(np.where(underwater, -1, idx))
+    duration = idx - last_peak
+    return drawdown, duration
+
 def create_drawdowns(pnl):
     """
     Calculatae the largest peak-to-trough drawdown of the PnL curve
     as well as the duration of the drawdown. Requires that the pnl_returns is a pandas series.
-    :param pnl: A pandas series representing period percentage returns.
-    :return: drawdown, duration
+    Drawdown is a percentage of the high water mark, 0.1 meaning 10% below the previous peak.
+    :param pnl: A pandas series representing the equity curve (cumulative returns).
+    :return: drawdown, max drawdown, max drawdown duration
     """
+    drawdown, duration = _drawdown_arrays(pnl)
+    max_dd = np.nanmax(drawdown) if np.any(~np.isnan(drawdown)) else 0.0
+    max_dd_duration = duration.max() if duration.size else 0
+    return pd.Series(drawdown, index=pnl.index), max_dd, max_dd_duration
 
-    #Calculate the culmulative return curve
-    #and set up the high water mark
-    hwm = [0]
-    #Code missing? 위 함수의 return series랑 뭐가 다름?
+def create_calmar_ratio(total_return, max_dd, n_periods, periods="minutely"):
+    """
+    Create calmar ratio, i.e. annualised (compounded) return over max drawdown.
+    :param total_return: Final equity over initial equity, ex) 1.05 for +5%
+    :param max_dd: Max percentage drawdown
+    :param n_periods: Number of return periods in the backtest
+    :param periods: Daily, Hourly, Minutely (see periods_per_year)
+    :return: NaN when the max drawdown is below MIN_DRAWDOWN, where the ratio only measures rounding noise
+    """
+    if not max_dd > MIN_DRAWDOWN or not n_periods or total_return <= 0:
+        return np.nan
+    years = n_periods / periods_per_year(periods)
+    return (total_return ** (1.0 / years) - 1.0) / max_dd
 
-    #Create the drawdown and duration series
-    idx = pnl.index
-    drawdown = pd.Series(index=idx)
-    duration = pd.Series(index=idx)
+def create_turnover(traded_value, total_value, periods="minutely"):
+    """
+    Create annualised turnover, i.e. traded value per year over average portfolio value.
+    :param traded_value: Absolute value in Wons of all fills in the backtest
+    :param total_value: A pandas series or NumPy array of portfolio total value per bar
+    :param periods: Daily, Hourly, Minutely (see periods_per_year)
+    """
+    total_value = np.asarray(total_value, dtype=np.float64)
+    if total_value.size < 2:
+        return np.nan
+    years = (total_value.size - 1) / periods_per_year(periods)
+    return traded_value / np.nanmean(total_value) / years
 
-    #Loop over the index range
-    for t in range(1, len(idx)):
-        hwm.append(max(hwm[t-1], pnl[t]))
-        drawdown[t] = hwm[t] - pnl[t] #이거 맞나? 나누기 pnl[t] 해줘야될듯
-        duration[t] = (0 if drawdown[t] == 0 else duration[t-1]+1)
-    return drawdown, drawdown.max(), duration.max()
+def create_performance_stats(total_value, periods="minutely", traded_value=None):
+    """
+    Computes every performance statistic of an equity curve in one vectorised pass.
+    Scales linearly with the number of bars, there is no Python loop over the curve.
+    Missing values (ex. a symbol not trading yet) are padded forward as pandas pct_change does.
+    :param total_value: A pandas series of portfolio total value per bar
+    :param periods: Daily, Hourly, Minutely (see periods_per_year)
+    :param traded_value: Absolute value in Wons of all fills, turnover is NaN if None
+    :return: dict of per bar series (returns, equity_curve, drawdown, drawdown_duration)
+             and scalar statistics
+    """
+    values = _ffill(np.asarray(total_value, dtype=np.float64))
+    returns = np.empty_like(values)
+    returns[:1] = np.nan
+    with np.errstate(divide='ignore', invalid='ignore'):
+        returns[1:] = values[1:] / values[:-1] - 1.0
+    equity = values / values[0] if values.size else values
+    drawdown, duration = _drawdown_arrays(equity) #from the initial equity, a loss on the first return is a drawdown
+    equity[:1] = np.nan #Same as (1.0 + returns).cumprod() with a leading NaN
+    valid = returns[~np.isnan(returns)]
+    total_return = equity[-1] if values.size > 1 else 1.0
+    max_dd = np.nanmax(drawdown) if valid.size else 0.0
+    n = periods_per_year(periods)
 
+    index = getattr(total_value, 'index', None)
+    return {
+        'returns': pd.Series(returns, index=index),
+        'equity_curve': pd.Series(equity, index=index),
+        'drawdown': pd.Series(drawdown, index=index),
+        'drawdown_duration': pd.Series(duration, index=index),
+        'total_return': total_return,
+        'sharpe_ratio': np.sqrt(n) * (np.mean(valid) / np.std(valid)) if np.any(valid != valid[:1]) else np.nan,
+        'sortino_ratio': create_sortino_ratio(valid, periods),
+        'max_drawdown': max_dd,
+        'max_drawdown_duration': duration.max() if duration.size else 0,
+        'calmar_ratio': create_calmar_ratio(total_return, max_dd, valid.size, periods),
+        'turnover': np.nan if traded_value is None else create_turnover(traded_value, values, periods),
+    }
@@ -3,10 +3,10 @@ import queue
 import numpy as np
 import pandas as pd
 from math import floor
-import matplotlib.pyplot as plt
 
 from event import FillEvent, OrderEvent
-from performance import create_sharpe_ratio, create_drawdowns
+from history import PortfolioHistory
+from performance import create_performance_stats
 
 class Portfolio(object):
     """
@@ -17,9 +17,11 @@ class Portfolio(object):
 
     The holdings DataFrame stores the cash and total market holdings value of each symbol for a particular time-index,
     as well as the percentage change in portfolio total across bars.
+
+    Both are recorded bar by bar into the NumPy matrices of a PortfolioHistory (self.history).
     """
 
-    def __init__(self, bars, events, start_date, initial_cap=10000.0):
+    def __init__(self, bars, events, start_date, initial_cap=10000.0, results_sink=None, base_quantity=1):
         """
         Initialises the portfolio with bars and an event queue.
         Also includes a starting datetime index and initial capital
@@ -27,6 +29,8 @@ class Portfolio(object):
         :param events: The Event Queue object.
         :param start_date: The start date of portfolio
         :param initial_cap: The starting capital in KRW
+        :param results_sink: A ResultsSink (see resultsink.py) the history is streamed to, None keeps it in memory
+        :param base_quantity: Quantity ordered for an entry signal of strength 1.0
         """
 
         self.bars = bars #is bars a function?
@@ -34,31 +38,41 @@ class Portfolio(object):
         self.symbol_list = self.bars.symbol_list #?
         self.start_date = start_date
         self.initial_cap = initial_cap
+        self.base_quantity = base_quantity
 
-        self.all_positions = self.construct_all_positions()
         self.current_positions = self.construct_current_positions()
-        self.all_holdings = self.construct_all_holdings()
         self.current_holdings = self.construct_current_holdings()
+        self.results_sink = results_sink
+        self.history = self.construct_history()
+        self.traded_value = 0.0 #Absolute value of all fills, for turnover
 
-    def construct_all_positions(self):
+    def construct_history(self):
+        """
+        Constructs the position/holding history using the start_date to determine when the time index will begin
+        종목별 보유수량, 평가금액, 현금, 수수료
+        If the DataHandler knows its number of bars (n_bars), the matrices are allocated once at the right size,
+        unless the history is streamed to a sink, which bounds them to its batch size.
         """
-        Constructs the positions list using the start_date to determine when the time index will begin
-        종목별 보유수량
+        n_bars = getattr(self.bars, 'n_bars', None)
+        history = PortfolioHistory(self.symbol_list, capacity=n_bars + 2 if n_bars else 1024,
+                                   sink=self.results_sink)
+        history.record(self.start_date, [0] * len(self.symbol_list), [0.0] * len(self.symbol_list),
+                       self.initial_cap, 0.0)
+        return history
+
+    @property
+    def all_positions(self):
         """
-        all_pos_dict = dict((k,v) for k,v in [(s,0) for s in self.symbol_list])
-        all_pos_dict["datetime"] = self.start_date
-        return [all_pos_dict]
+        The positions history as a list of dicts (built on demand, prefer self.history.positions_frame())
+        """
+        return self.history.positions_dicts()
 
-    def construct_all_holdings(self):
+    @property
+    def all_holdings(self):
         """
-        Constructs the holding list using the start_date to determine when the time index will begin
-        종목별 평가금액, 현금, 수수료
+        The holdings history as a list of dicts (built on demand, prefer self.history.holdings_frame())
         """
-        d = dict((k,v) for k,v in [(s,0.0) for s in self.symbol_list])
-        d['cash'] = self.initial_cap
-        d['commission'] = 0.0
-        d['total_value'] = self.initial_cap
-        return [d]
+        return self.history.holdings_dicts()
 
     def construct_current_positions(self):
         """
@@ -96,31 +110,14 @@ class Portfolio(object):
         #이후 update_timeindex() 함수를 통해 반영하는 구조.
         latest_datetime = self.bars.get_latest_bar_datetime(self.symbol_list[0])
 
-        #Update positions
-        pos_dict = dict((k, v) for k, v in [(s,0) for s in self.symbol_list])
-        pos_dict["datetime"] = latest_datetime
-
-        for s in self.symbol_list:
-            pos_dict[s] = self.current_positions[s]
-
-        #Append the current positions
-        self.all_positions.append(pos_dict)
-
-        #Update holdings
-        hold_dict = dict((k, v) for k, v in [(s, 0.0) for s in self.symbol_list])
-        hold_dict["datetime"] = latest_datetime
-        hold_dict['cash'] = self.current_holdings['cash']
-        hold_dict['commission'] = self.current_holdings['commission']
-        hold_dict['total_value'] = self.current_holdings['cash']
-
-        for s in self.symbol_list:
-            #Approximation by close price
-            market_value = self.current_positions[s] * self.bars.get_latest_bar_value(s,'close')
-            hold_dict[s] = market_value
-            hold_dict['total_value'] += market_value
-
-        #Append the current holdings
-        self.all_holdings.append(hold_dict)
+        #Record positions and holdings, market value approximated by close price
+        self.history.record(
+            latest_datetime,
+            [self.current_positions[s] for s in self.symbol_list],
+            [self.bars.get_latest_bar_value(s, 'close') for s in self.symbol_list],
+            self.current_holdings['cash'],
+            self.current_holdings['commission']
+        )
 
     def update_positions_from_fill(self, fill):
         """
@@ -156,12 +153,16 @@ class Portfolio(object):
             print("Fill direction error at holdings")
 
         # Update holdings list with new quantity
-        fill_cost = self.bars.get_latest_bar_value(fill.symbol, 'close') #Live Trading에서는 hts의 매입금액 사용하면 될듯, 결국 Slippage 비용도 여기에 반영해야함.
-        cost = fill_dir * fill_cost * fill.quantity
+        if fill.fill_cost is not None: #limit order fills (and live fills) carry the amount actually paid
+            cost = fill_dir * fill.fill_cost
+        else:
+            fill_cost = self.bars.get_latest_bar_value(fill.symbol, 'close') #Live Trading에서는 hts의 매입금액 사용하면 될듯, 결국 Slippage 비용도 여기에 반영해야함.
+            cost = fill_dir * fill_cost * fill.quantity
         self.current_holdings[fill.symbol] += cost
         self.current_holdings['commission'] += fill.commission #수수료
         self.current_holdings["cash"] -= cost + fill.commission
         self.current_holdings['total_value'] -= cost + fill.commission #update_timeindex에서 q * close 된 평가금액 얹어줌.
+        self.traded_value += abs(cost)
 
     def update_fill(self, event):
         """
@@ -186,20 +187,27 @@ class Portfolio(object):
         strength = signal.strength
         cur_price = signal.cur_price
 
-        mkt_quantity = 1
+        mkt_quantity = int(round(self.base_quantity * strength)) #strength scales the entry, ex. hedge ratio of a pair leg
         est_fill_cost = cur_price * mkt_quantity #for Backtest & Slippage calc / slippage cost = fill_cost(HTS) - est_fill_cost
         cur_quantity = self.current_positions[symbol]
         order_type = 'MKT' #추후 지정가 주문도 고려필요
 
-        if direction == 'LONG' and cur_quantity == 0:
-            order = OrderEvent(symbol, order_type, mkt_quantity, 'BUY', est_fill_cost)
-        if direction == 'SHORT' and cur_quantity == 0:
-            order = OrderEvent(symbol, order_type, mkt_quantity, 'SELL', est_fill_cost)
+        if direction in ('LONG', 'SHORT') and cur_quantity == 0 and mkt_quantity <= 0:
+            print("No order for %s %s: strength %s rounds to %d shares" % (direction, symbol, strength, mkt_quantity))
+
+        if direction == 'LONG' and cur_quantity == 0 and mkt_quantity > 0:
+            order = OrderEvent(symbol, order_type, mkt_quantity, 'BUY', est_fill_cost,
+                               strategy_id=signal.strategy_id)
+        if direction == 'SHORT' and cur_quantity == 0 and mkt_quantity > 0:
+            order = OrderEvent(symbol, order_type, mkt_quantity, 'SELL', est_fill_cost,
+                               strategy_id=signal.strategy_id)
 
         if direction == 'EXIT' and cur_quantity > 0:
-            order = OrderEvent(symbol, order_type, abs(cur_quantity), 'SELL', est_fill_cost)
+            order = OrderEvent(symbol, order_type, abs(cur_quantity), 'SELL', cur_price * abs(cur_quantity),
+                               strategy_id=signal.strategy_id)
         if direction == 'EXIT' and cur_quantity < 0:
-            order = OrderEvent(symbol, order_type, abs(cur_quantity), 'BUY', est_fill_cost)
+            order = OrderEvent(symbol, order_type, abs(cur_quantity), 'BUY', cur_price * abs(cur_quantity),
+                               strategy_id=signal.strategy_id)
         return order
 
     def update_signal(self, event):
@@ -212,39 +220,48 @@ class Portfolio(object):
 
     def create_equity_curve_dataframe(self):
         """
-        Creates a pandas DataFrame from the all_holdings list of dictionaries.
+        Creates a pandas DataFrame from the holdings history matrices.
+        When the history is streamed to a ResultsSink, the curve only has cash, commission and total_value,
+        per symbol holdings are read back with resultsink.read_results().
         :return:
         """
-        curve = pd.DataFrame(self.all_holdings)
-        curve.set_index('datetime', inplace=True)
-        curve['returns'] = curve['total_value'].pct_change()
+        self.history.close()
+        if self.history.sink is None:
+            curve = self.history.holdings_frame()
+        else:
+            curve = self.history.equity_frame()
+        curve['returns'] = curve['total_value'].ffill().pct_change() #pads missing values, as pct_change used to
         curve['equity_curve'] = (1.0 + curve['returns']).cumprod()
         self.equity_curve = curve
         #class 변수로 만듦
 
-    def output_summary_stats(self):
+    def output_summary_stats(self, csv_path=None):
         """
         Creates a list of summary statistics for the portfolio.
+        The numeric values are kept in self.performance_stats.
+        :param csv_path: Where the equity curve is exported as CSV, None (default) to skip it
         :return:
         """
-        total_return = self.equity_curve['equity_curve'][-1]
-        returns = self.equity_curve['returns']
-        pnl = self.equity_curve['equity_curve']
         # self.equity_curve.to_csv("prac_equity_curve.csv")
         # pd.DataFrame(self.all_positions).to_csv("prac_position.csv")
 
-        sharpe_ratio = create_sharpe_ratio(returns, periods='minutely')
-        drawdown, max_dd, max_dd_duration = create_drawdowns(pnl)
-        self.equity_curve['drawdown'] = drawdown
+        perf = create_performance_stats(self.equity_curve['total_value'], periods='minutely',
+                                        traded_value=self.traded_value)
+        self.equity_curve['drawdown'] = perf['drawdown']
+        self.performance_stats = dict((k, v) for k, v in perf.items() if not isinstance(v, pd.Series))
 
         stats = [
-            ('Total_Return', "%0.2f%%" % ((total_return-1.0)*100.0)),
-            ('Sharpe_Ratio', "%0.2f" % sharpe_ratio),
-            ("Max Drawdown", "%0.2f%%" % (max_dd * 100.0)),
-            ("Max Drawdown Dur.", "%d" % max_dd_duration)
+            ('Total_Return', "%0.2f%%" % ((perf['total_return']-1.0)*100.0)),
+            ('Sharpe_Ratio', "%0.2f" % perf['sharpe_ratio']),
+            ('Sortino_Ratio', "%0.2f" % perf['sortino_ratio']),
+            ("Max Drawdown", "%0.2f%%" % (perf['max_drawdown'] * 100.0)),
+            ("Max Drawdown Dur.", "%d" % perf['max_drawdown_duration']),
+            ('Calmar_Ratio', "%0.2f" % perf['calmar_ratio']),
+            ('Turnover', "%0.2f" % perf['turnover'])
         ]
 
-        self.equity_curve.to_csv('equity_curve.csv')
+        if csv_path is not None:
+            self.equity_curve.to_csv(csv_path)
         # pnl.plot()
         # plt.show()
         return stats
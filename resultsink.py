@@ -0,0 +1,149 @@
+import glob
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+FORMATS = ('npz', 'parquet')
+
+def _pyarrow():
+    """
+    Imports pyarrow on first use, it is optional and slow to import.
+    :return: (pyarrow, pyarrow.parquet)
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("pyarrow is needed to read or write parquet results")
+    return pa, pq
+
+def parquet_available():
+    try:
+        _pyarrow()
+    except ImportError:
+        return False
+    return True
+
+class ResultsSink(object):
+    """
+    Streams the portfolio history (positions, holdings, cash, commission, total value)
+    to a directory of compressed columnar parts, one part per batch of rows:
+    part-00000.npz, part-00001.npz, ... or part-00000.parquet, ... with format='parquet' (needs pyarrow).
+
+    Holds no open file between writes, so it can be pickled along with the portfolio (see checkpoint.py).
+    Read the results back with read_results().
+    """
+
+    def __init__(self, path, symbol_list, batch_size=65536, format='npz'):
+        """
+        :param path: Output directory, parts of a previous run in it are removed
+        :param symbol_list: The list of symbol strings, giving the column order
+        :param batch_size: Number of rows buffered by PortfolioHistory between writes
+        :param format: 'npz' or 'parquet'
+        """
+        if format not in FORMATS:
+            raise ValueError("format should be one of %s" % (FORMATS,))
+        if format == 'parquet':
+            _pyarrow()
+
+        self.path = path
+        self.symbol_list = list(symbol_list)
+        self.batch_size = batch_size
+        self.format = format
+        self.n_parts = 0
+        self.n_rows = 0
+
+        os.makedirs(path, exist_ok=True)
+        for old in glob.glob(os.path.join(path, 'part-*')):
+            os.remove(old)
+        with open(os.path.join(path, 'meta.json'), 'w') as f:
+            json.dump({'symbol_list': self.symbol_list, 'format': format}, f)
+
+    def write(self, datetimes, positions, holdings, cash, commission, total_value):
+        """
+        Writes one part.
+        :param datetimes: Datetimes of the rows
+        :param positions: Quantities held, rows x symbols
+        :param holdings: Market values, rows x symbols
+        """
+        part = os.path.join(self.path, 'part-%05d.%s' % (self.n_parts, self.format))
+        dt = pd.DatetimeIndex(datetimes).asi8 #int64 ns
+        if self.format == 'npz':
+            np.savez_compressed(part, datetime=dt, positions=positions, holdings=holdings,
+                                cash=cash, commission=commission, total_value=total_value)
+        else:
+            pa, pq = _pyarrow()
+            columns = {'datetime': pa.array(dt, type=pa.timestamp('ns'))}
+            for j, s in enumerate(self.symbol_list):
+                columns['position:%s' % s] = positions[:, j]
+            for j, s in enumerate(self.symbol_list):
+                columns['holding:%s' % s] = holdings[:, j]
+            columns['cash'] = cash
+            columns['commission'] = commission
+            columns['total_value'] = total_value
+            pq.write_table(pa.table(columns), part, compression='zstd')
+        self.n_parts += 1
+        self.n_rows += len(dt)
+
+    def close(self):
+        pass
+
+
+def read_results(path):
+    """
+    Loads the parts written by a ResultsSink.
+    :param path: Directory of the ResultsSink
+    :return: (positions, holdings) DataFrames indexed on datetime, as PortfolioHistory.positions_frame()
+             and PortfolioHistory.holdings_frame() would have built them
+    """
+    with open(os.path.join(path, 'meta.json')) as f:
+        meta = json.load(f)
+    symbol_list = meta['symbol_list']
+    parts = sorted(glob.glob(os.path.join(path, 'part-*.%s' % meta['format'])))
+
+    if meta['format'] == 'npz':
+        loaded = [np.load(part) for part in parts]
+        def column(name):
+            return np.concatenate([p[name] for p in loaded]) if loaded else np.empty(0)
+        index = pd.DatetimeIndex(column('datetime').astype('datetime64[ns]'), name='datetime')
+        positions = pd.DataFrame(column('positions').reshape(len(index), len(symbol_list)),
+                                 index=index, columns=symbol_list)
+        holdings = pd.DataFrame(column('holdings').reshape(len(index), len(symbol_list)),
+                                index=index, columns=symbol_list)
+        for name in ('cash', 'commission', 'total_value'):
+            holdings[name] = column(name)
+    else:
+        pa, pq = _pyarrow()
+        table = pa.concat_tables([pq.read_table(part) for part in parts]).to_pandas()
+        index = pd.DatetimeIndex(table['datetime'], name='datetime')
+        positions = pd.DataFrame(table[['position:%s' % s for s in symbol_list]].values,
+                                 index=index, columns=symbol_list)
+        holdings = pd.DataFrame(table[['holding:%s' % s for s in symbol_list]].values,
+                                index=index, columns=symbol_list)
+        for name in ('cash', 'commission', 'total_value'):
+            holdings[name] = table[name].values
+    return positions, holdings
+
+def read_equity(path):
+    """
+    Loads only the datetime, cash, commission and total_value columns written by a ResultsSink.
+    :param path: Directory of the ResultsSink
+    :return: DataFrame of cash, commission and total_value indexed on datetime, as PortfolioHistory.equity_frame()
+    """
+    with open(os.path.join(path, 'meta.json')) as f:
+        meta = json.load(f)
+    parts = sorted(glob.glob(os.path.join(path, 'part-*.%s' % meta['format'])))
+    names = ('cash', 'commission', 'total_value')
+
+    if meta['format'] == 'npz':
+        loaded = [np.load(part) for part in parts] #members are decompressed on access only
+        columns = dict((name, np.concatenate([p[name] for p in loaded]) if loaded else np.empty(0))
+                       for name in ('datetime',) + names)
+    else:
+        pa, pq = _pyarrow()
+        table = pa.concat_tables([pq.read_table(part, columns=['datetime'] + list(names)) for part in parts])
+        columns = dict((name, table.column(name).to_numpy()) for name in ('datetime',) + names)
+    index = pd.DatetimeIndex(np.asarray(columns.pop('datetime')).astype('datetime64[ns]'), name='datetime')
+    return pd.DataFrame(columns, index=index, columns=list(names))
@@ -0,0 +1,57 @@
+import numpy as np
+
+class RingBuffer(object):
+    """
+    Fixed capacity FIFO buffer of scalar values backed by a NumPy array.
+
+    Every value is written twice, at slot i and at slot i + capacity, so that the latest n values
+    are always one contiguous slice of the underlying array. Memory stays flat at 2 * capacity values
+    no matter how many values are appended.
+    """
+
+    def __init__(self, capacity, dtype=np.float64):
+        """
+        Initialises the ring buffer.
+        :param capacity: Max number of values kept
+        :param dtype: NumPy dtype of the values
+        """
+        if capacity < 1:
+            raise ValueError("capacity should be a positive integer")
+
+        self.capacity = capacity
+        self.count = 0
+        self._data = np.zeros(2 * capacity, dtype=dtype)
+        self._pos = 0 #next slot to be written
+
+    def __len__(self):
+        return self.count
+
+    def append(self, value):
+        """
+        Appends a value, dropping the oldest one when the buffer is full.
+        """
+        self._data[self._pos] = value
+        self._data[self._pos + self.capacity] = value
+        self._pos += 1
+        if self._pos == self.capacity:
+            self._pos = 0
+        if self.count < self.capacity:
+            self.count += 1
+
+    def last(self):
+        """
+        :return: the latest value appended
+        """
+        if self.count == 0:
+            raise IndexError("RingBuffer is empty")
+        return self._data[self._pos + self.capacity - 1]
+
+    def latest(self, n):
+        """
+        :param n: Number of wanted values
+        :return: view of the latest n values (or all values if less available), oldest first.
+                 The view is overwritten by later appends, copy it if it should be kept.
+        """
+        n = min(n, self.count)
+        end = self._pos + self.capacity
+        return self._data[end - n:end]
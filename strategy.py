@@ -20,6 +20,17 @@ class Strategy(object):
 
     __metaclass__ = ABCMeta
 
+    #Largest number of bars the strategy asks for through get_latest_n_bars(_value).
+    #Backtest passes it to DataHandler.set_max_lookback() so history doesn't grow forever. None for unbounded.
+    max_lookback = None
+
+    #Set to False (ex. Backtest(verbose=False)) to keep calc_signals from printing
+    verbose = True
+
+    #Put on every SignalEvent, orders and fills are routed back to the strategy's portfolio by it.
+    #MultiStrategyBacktest gives each of its strategies its own id.
+    strategy_id = 1
+
     @abstractmethod
     def calc_signals(self, *args, **kwargs):
         """
@@ -0,0 +1,115 @@
+from contextlib import redirect_stdout
+import functools
+import itertools
+import multiprocessing
+import os
+
+import pandas as pd
+
+from backtest import Backtest
+from data import HistoricMinArrayDataHandler
+from execution import SimulatedExecutionHandler
+from portfolio import Portfolio
+
+#Per worker process state, set up once by _init_worker
+_worker = {}
+
+def expand_grid(param_grid):
+    """
+    :param param_grid: dict of parameter name -> list of values, or a list of such dicts
+    :return: list of parameter dicts, one per combination
+    """
+    if isinstance(param_grid, dict):
+        param_grid = [param_grid]
+    params = []
+    for grid in param_grid:
+        names = sorted(grid)
+        for values in itertools.product(*[grid[name] for name in names]):
+            params.append(dict(zip(names, values)))
+    return params
+
+def _init_worker(csv_dir, symbol_list, data_handler):
+    """
+    Loads the data once per worker. Handlers that can be rewound (ex. HistoricMinArrayDataHandler)
+    are reused by every backtest the worker runs, others are built again per backtest.
+    """
+    _worker.clear()
+    _worker['csv_dir'] = csv_dir
+    _worker['symbol_list'] = symbol_list
+    _worker['data_handler_cls'] = data_handler
+    if hasattr(data_handler, 'rewind'):
+        with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+            _worker['data_handler'] = data_handler(None, csv_dir, symbol_list)
+
+def _reuse_data_handler(events, csv_dir, symbol_list):
+    return _worker['data_handler'].rewind(events)
+
+def _run_one(task):
+    """
+    Runs one backtest without printing or plotting and returns its metrics.
+    """
+    params, initial_cap, start_date, execution_handler, portfolio, strategy = task
+    data_handler = _reuse_data_handler if 'data_handler' in _worker else _worker['data_handler_cls']
+
+    with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+        backtest = Backtest(
+            _worker['csv_dir'], _worker['symbol_list'], initial_cap, 0.0, start_date,
+            data_handler, execution_handler, portfolio, functools.partial(strategy, **params),
+            verbose=False
+        )
+        backtest._run_backtest()
+        backtest.portfolio.create_equity_curve_dataframe()
+        backtest.portfolio.output_summary_stats(csv_path=None)
+
+    row = dict(params)
+    row.update(backtest.portfolio.performance_stats)
+    row['signals'] = backtest.signals
+    row['orders'] = backtest.orders
+    row['fills'] = backtest.fills
+    return row
+
+def run_parameter_sweep(csv_dir, symbol_list, initial_cap, start_date, strategy, param_grid,
+                        data_handler=HistoricMinArrayDataHandler, execution_handler=SimulatedExecutionHandler,
+                        portfolio=Portfolio, processes=None):
+    """
+    Runs one independent Backtest per parameter combination across a process pool.
+    Each worker loads the data once, and output (printing, plotting, equity_curve.csv) is suppressed.
+
+    Classes are sent to the workers by reference, so they should be importable from a module
+    (or defined in __main__ on platforms that fork).
+    :param csv_dir: Hard root of CSV
+    :param symbol_list: The list of symbol strings
+    :param initial_cap: The starting capital of portfolio
+    :param start_date: The start datetime of strategy
+    :param strategy: (Class) Strategy, built as strategy(bars, events, **params)
+    :param param_grid: dict of parameter name -> list of values, or a list of such dicts
+    :param data_handler: (Class) Handles market data feed
+    :param execution_handler: (Class) Handles the Order/Fill for trade
+    :param portfolio: (Class) Portfolio
+    :param processes: Number of worker processes, None for os.cpu_count(), 1 runs in this process
+    :return: pandas DataFrame with one row per parameter set: the parameters,
+             the performance stats of Portfolio.output_summary_stats and the signal/order/fill counts
+    """
+    params = expand_grid(param_grid)
+    tasks = [(p, initial_cap, start_date, execution_handler, portfolio, strategy) for p in params]
+    init_args = (csv_dir, symbol_list, data_handler)
+
+    if processes == 1:
+        _init_worker(*init_args)
+        rows = [_run_one(task) for task in tasks]
+    else:
+        with multiprocessing.Pool(processes, initializer=_init_worker, initargs=init_args) as pool:
+            rows = pool.map(_run_one, tasks, chunksize=1)
+    return pd.DataFrame(rows)
+
+
+if __name__ == "__main__":
+    import datetime
+    from ma_strategy import MovingAverageCrossStrategy
+
+    results = run_parameter_sweep(
+        'G:/공유 드라이브/Project_TBD/Stock_Data/Minute/', ["005930"], 1000000.0,
+        datetime.datetime(2019, 11, 1, 9, 0, 0), MovingAverageCrossStrategy,
+        {'short_window': [50, 100, 200], 'long_window': [400, 800]}
+    )
+    print(results.sort_values('sharpe_ratio', ascending=False).to_string())
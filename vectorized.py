@@ -0,0 +1,217 @@
+from contextlib import redirect_stdout
+import copy
+import functools
+import os
+
+import numpy as np
+import pandas as pd
+
+from data import HistoricMinArrayDataHandler
+from performance import create_performance_stats
+
+def rolling_mean(x, window):
+    """
+    Rolling mean of the last window values of each column, over the values available when less than window
+    (as np.mean(bars[-window:]) in the event engine). A window containing a NaN gives NaN.
+    :param x: 2-D array, bars x symbols
+    :param window: Number of bars
+    """
+    x = np.asarray(x, dtype=np.float64)
+    isnan = np.isnan(x)
+    csum = np.cumsum(np.where(isnan, 0.0, x), axis=0)
+    cnan = np.cumsum(isnan, axis=0)
+
+    lagged_sum = np.zeros_like(csum)
+    lagged_nan = np.zeros_like(cnan)
+    lagged_sum[window:] = csum[:-window]
+    lagged_nan[window:] = cnan[:-window]
+
+    count = np.minimum(np.arange(1, x.shape[0] + 1), window).reshape((-1,) + (1,) * (x.ndim - 1))
+    mean = (csum - lagged_sum) / count
+    mean[(cnan - lagged_nan) > 0] = np.nan
+    return mean
+
+def crossover_state(short_sma, long_sma):
+    """
+    Long/out state of the moving average cross: goes long (1) when short > long, out (0) when short < long,
+    and otherwise keeps the previous state, starting out.
+    """
+    code = np.where(short_sma > long_sma, 1, np.where(short_sma < long_sma, 0, -1))
+    n = code.shape[0]
+    idx = np.where(code >= 0, np.arange(n).reshape((-1,) + (1,) * (code.ndim - 1)), -1)
+    np.maximum.accumulate(idx, axis=0, out=idx)
+    state = np.take_along_axis(code, np.maximum(idx, 0), axis=0)
+    state[idx < 0] = 0
+    return state
+
+
+class VectorizedMACrossBacktest(object):
+    """
+    Whole-array backtest of MovingAverageCrossStrategy with Portfolio's naive 1 share orders,
+    filled at the close of the signal bar by SimulatedExecutionHandler, with FillEvent.calc_commission's
+    0.3% sell tax. Uses the same CSV data and alignment as HistoricMinArrayDataHandler.
+
+    The equity curve reproduces the rows Portfolio records in the event engine:
+    the start_date row, one row per bar valued before that bar's fills, and the last bar once more.
+    """
+
+    sell_tax = 0.003
+
+    def __init__(self, csv_dir, symbol_list, initial_cap, start_date, short_window=100, long_window=400,
+                 data_handler=None):
+        """
+        :param csv_dir: Hard root of CSV
+        :param symbol_list: The list of symbol strings
+        :param initial_cap: The starting capital of portfolio
+        :param start_date: The start datetime of strategy
+        :param short_window: The short moving average lookback
+        :param long_window: The long moving average lookback
+        :param data_handler: An already loaded HistoricMinArrayDataHandler, loaded from csv_dir if None
+        """
+        self.csv_dir = csv_dir
+        self.symbol_list = symbol_list
+        self.initial_cap = initial_cap
+        self.start_date = start_date
+        self.short_window = short_window
+        self.long_window = long_window
+
+        if data_handler is None:
+            data_handler = HistoricMinArrayDataHandler(None, csv_dir, symbol_list)
+        self.bar_index = data_handler.bar_index
+        self.close = np.column_stack([data_handler.symbol_columns[s]['close'] for s in symbol_list]).astype(np.float64)
+
+    def period(self, start, stop, short_window=None, long_window=None):
+        """
+        :return: a backtest of bars start:stop only, started on the first of them, sharing this backtest's close array
+        """
+        period = copy.copy(self)
+        period.close = self.close[start:stop]
+        period.bar_index = self.bar_index[start:stop]
+        period.start_date = period.bar_index[0]
+        if short_window is not None:
+            period.short_window = short_window
+        if long_window is not None:
+            period.long_window = long_window
+        return period
+
+    def calc_signals(self, short_sma=None, long_sma=None):
+        """
+        :param short_sma: Precomputed short SMA (bars x symbols), computed from close if None
+        :param long_sma: Precomputed long SMA (bars x symbols), computed from close if None
+        :return: the state (1 long, 0 out) held after each bar, bars x symbols
+        """
+        if short_sma is None:
+            short_sma = rolling_mean(self.close, min(self.short_window, self.long_window))
+        if long_sma is None:
+            long_sma = rolling_mean(self.close, self.long_window)
+        return crossover_state(short_sma, long_sma)
+
+    def run(self, state=None):
+        """
+        Runs the backtest.
+        :param state: Positions held after each bar (bars x symbols), from calc_signals() if None
+        :return: (equity curve DataFrame as Portfolio.create_equity_curve_dataframe, positions DataFrame)
+        """
+        close = self.close
+        n, n_symbols = close.shape
+        if state is None:
+            state = self.calc_signals()
+        state = np.asarray(state, dtype=np.int64)
+
+        prev = np.zeros_like(state)
+        prev[1:] = state[:-1]
+        fill_dir = state - prev #1 BUY, -1 SELL, 0 no fill
+
+        cost = np.where(fill_dir != 0, fill_dir * close * 1, 0.0)
+        commission = np.where(fill_dir < 0, self.sell_tax * close, 0.0)
+        self.traded_value = np.abs(cost).sum()
+
+        #Fills are applied one by one in bar then symbol order, as the event queue does
+        cash = np.subtract.accumulate(np.concatenate(([self.initial_cap], (cost + commission).ravel())))
+        cash = cash[::n_symbols] #cash[t] is the cash after the fills of the first t bars
+        total_commission = np.add.accumulate(np.concatenate(([0.0], commission.ravel())))[::n_symbols]
+
+        #Row of bar t is valued before bar t's fills, plus the start row and the repeated last bar
+        positions = np.vstack([np.zeros((1, n_symbols), dtype=np.int64), prev, state[-1:]])
+        prices = np.vstack([np.zeros((1, n_symbols)), close, close[-1:]])
+        holdings = positions * prices
+        cash = np.concatenate((cash[:1], cash))
+        total_commission = np.concatenate((total_commission[:1], total_commission))
+
+        bar_times = np.asarray(self.bar_index, dtype='datetime64[ns]')
+        index = pd.DatetimeIndex(np.concatenate(([np.datetime64(self.start_date, 'ns')], bar_times, bar_times[-1:])),
+                                 name='datetime')
+        columns = dict(zip(self.symbol_list, holdings.T))
+        columns['cash'] = cash
+        columns['commission'] = total_commission
+        columns['total_value'] = cash + holdings.sum(axis=1)
+        curve = pd.DataFrame(columns, index=index)
+        curve['returns'] = curve['total_value'].ffill().pct_change()
+        curve['equity_curve'] = (1.0 + curve['returns']).cumprod()
+
+        self.equity_curve = curve
+        self.positions = pd.DataFrame(positions, index=index, columns=self.symbol_list)
+        return self.equity_curve, self.positions
+
+    def output_summary_stats(self):
+        """
+        :return: the performance stats dict of create_performance_stats
+        """
+        perf = create_performance_stats(self.equity_curve['total_value'], periods='minutely',
+                                        traded_value=self.traded_value)
+        return dict((k, v) for k, v in perf.items() if not isinstance(v, pd.Series))
+
+
+def compare_with_event_engine(csv_dir, symbol_list, initial_cap, start_date, short_window=100, long_window=400,
+                              rtol=1e-9):
+    """
+    Parity harness: runs the event driven Backtest and VectorizedMACrossBacktest on the same data
+    and reports any divergence in trades (position changes) or equity (total value).
+    :param rtol: Relative tolerance on total value
+    :return: dict with 'trades_match', 'equity_match', 'max_equity_diff' and 'divergences',
+             a DataFrame of the rows where trades or total value differ
+    """
+    from backtest import Backtest
+    from execution import SimulatedExecutionHandler
+    from portfolio import Portfolio
+    from ma_strategy import MovingAverageCrossStrategy
+
+    with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+        backtest = Backtest(
+            csv_dir, symbol_list, initial_cap, 0.0, start_date,
+            HistoricMinArrayDataHandler, SimulatedExecutionHandler, Portfolio,
+            functools.partial(MovingAverageCrossStrategy, short_window=short_window, long_window=long_window)
+        )
+        backtest._run_backtest()
+    event_positions = backtest.portfolio.history.positions_frame()
+    event_total = backtest.portfolio.history.holdings_frame()['total_value']
+
+    vectorized = VectorizedMACrossBacktest(csv_dir, symbol_list, initial_cap, start_date, short_window, long_window,
+                                           data_handler=backtest.data_handler)
+    curve, positions = vectorized.run()
+
+    if len(event_total) != len(curve):
+        raise ValueError("Event engine recorded %d rows, vectorized %d" % (len(event_total), len(curve)))
+
+    event_trades = np.diff(event_positions.to_numpy(), axis=0)
+    vector_trades = np.diff(positions.to_numpy(), axis=0)
+    trade_diff = np.any(event_trades != vector_trades, axis=1)
+
+    a, b = event_total.to_numpy(), curve['total_value'].to_numpy()
+    equity_diff = ~np.isclose(a, b, rtol=rtol, atol=0.0, equal_nan=True)
+
+    bad = np.concatenate(([False], trade_diff)) | equity_diff
+    divergences = pd.DataFrame({
+        'event_total_value': a[bad],
+        'vectorized_total_value': b[bad],
+        'trade_mismatch': np.concatenate(([False], trade_diff))[bad],
+    }, index=curve.index[bad])
+
+    with np.errstate(invalid='ignore'):
+        max_equity_diff = np.nanmax(np.abs(a - b)) if a.size else 0.0
+    return {
+        'trades_match': not trade_diff.any(),
+        'equity_match': not equity_diff.any(),
+        'max_equity_diff': max_equity_diff,
+        'divergences': divergences,
+    }
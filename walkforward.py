@@ -0,0 +1,236 @@
+from collections import OrderedDict
+from contextlib import redirect_stdout
+import os
+
+import numpy as np
+import pandas as pd
+
+from data import HistoricMinArrayDataHandler
+from sweep import expand_grid
+from vectorized import VectorizedMACrossBacktest, rolling_mean
+
+class IndicatorCache(object):
+    """
+    Memoized indicator results shared across folds and parameter sets.
+    Entries are keyed by (symbol, field, indicator, window, date range start, date range end)
+    and evicted least recently used first once their total size exceeds max_bytes.
+    Cached arrays are read-only, as they are handed to every caller asking for the same key.
+    """
+    def __init__(self, max_bytes=256 * 1024 * 1024):
+        """
+        :param max_bytes: Memory budget of the cached arrays, 0 disables caching
+        """
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict() #key -> array, least recently used first
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, compute):
+        """
+        :param key: (symbol, field, indicator, window, start, end)
+        :param compute: Called without arguments to build the array when key is not cached
+        :return: the cached or newly computed array
+        """
+        value = self.lookup(key)
+        if value is not None:
+            return value
+
+        self.misses += 1
+        value = np.asarray(compute())
+        value.flags.writeable = False
+        if value.nbytes <= self.max_bytes: #a result over the whole budget is returned without being kept
+            self.entries[key] = value
+            self.nbytes += value.nbytes
+            while self.nbytes > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.nbytes -= evicted.nbytes
+                self.evictions += 1
+        return value
+
+    def lookup(self, key):
+        """
+        :return: the cached array of key, None if it is not in the cache
+        """
+        value = self.entries.get(key)
+        if value is not None:
+            self.entries.move_to_end(key)
+            self.hits += 1
+        return value
+
+    def clear(self):
+        self.entries.clear()
+        self.nbytes = 0
+
+    def stats(self):
+        """
+        :return: dict of hits, misses, evictions, entries and bytes held
+        """
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'entries': len(self.entries),
+            'bytes': self.nbytes,
+        }
+
+
+def walk_forward_folds(bar_index, train, test, anchored=False):
+    """
+    Splits the bars into consecutive train/test folds, each test period following its train period
+    and the next fold starting test later.
+    :param bar_index: DatetimeIndex of the bars
+    :param train: Length of a train period, a number of bars or a time span (ex. '5D', pd.Timedelta)
+    :param test: Length of a test period, a number of bars or a time span
+    :param anchored: If True, every train period starts at the first bar (expanding window)
+    :return: list of (train_start, train_stop, test_start, test_stop) bar positions, stops excluded
+    """
+    bar_index = pd.DatetimeIndex(bar_index)
+    n = len(bar_index)
+
+    def advance(pos, length):
+        if isinstance(length, (int, np.integer)):
+            return min(pos + int(length), n)
+        return int(bar_index.searchsorted(bar_index[pos] + pd.Timedelta(length), side='left'))
+
+    folds = []
+    start = 0
+    train_stop = advance(0, train)
+    while train_stop < n:
+        test_stop = advance(train_stop, test)
+        if test_stop <= train_stop:
+            break
+        if start < train_stop:
+            folds.append((start, train_stop, train_stop, test_stop))
+        if not anchored:
+            start = advance(start, test)
+        train_stop = test_stop #test periods follow each other without gap or overlap
+    return folds
+
+
+class WalkForwardMACross(object):
+    """
+    Walk-forward optimization of MovingAverageCrossStrategy on VectorizedMACrossBacktest.
+    For each fold, every parameter set of the grid is backtested on the train period, the best one
+    by metric is kept and backtested again on the following test period.
+
+    Each period is backtested as a Backtest started on its first bar would be: the moving averages
+    only see the bars of the period. They are built from an IndicatorCache (see sma), so a rolling mean
+    over the same bars is computed once whatever the number of folds and parameter sets using its window,
+    and the cache can be shared by several walk-forward runs on the same data.
+    """
+    def __init__(self, csv_dir, symbol_list, initial_cap, param_grid, train, test, anchored=False,
+                 metric='sharpe_ratio', cache=None, data_handler=None):
+        """
+        :param csv_dir: Hard root of CSV
+        :param symbol_list: The list of symbol strings
+        :param initial_cap: The starting capital of each period
+        :param param_grid: dict of parameter name (short_window, long_window) -> list of values, or a list of such dicts
+        :param train: Length of a train period, a number of bars or a time span (ex. '5D')
+        :param test: Length of a test period, a number of bars or a time span
+        :param anchored: If True, every train period starts at the first bar
+        :param metric: Key of VectorizedMACrossBacktest.output_summary_stats maximized on train, NaN ranks last
+        :param cache: IndicatorCache to use, a new one with the default budget if None
+        :param data_handler: An already loaded HistoricMinArrayDataHandler, loaded from csv_dir if None
+        """
+        self.symbol_list = symbol_list
+        self.initial_cap = initial_cap
+        self.params = expand_grid(param_grid)
+        self.metric = metric
+        self.cache = cache if cache is not None else IndicatorCache()
+
+        if data_handler is None:
+            with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+                data_handler = HistoricMinArrayDataHandler(None, csv_dir, symbol_list)
+        self.backtest = VectorizedMACrossBacktest(csv_dir, symbol_list, initial_cap, None, data_handler=data_handler)
+        self.bar_index = self.backtest.bar_index
+        self.folds = walk_forward_folds(self.bar_index, train, test, anchored)
+
+        windows = set()
+        for params in self.params:
+            short_window, long_window = params.get('short_window', 100), params.get('long_window', 400)
+            windows.update((min(short_window, long_window), long_window))
+        #Full length means are shared only if all of them stay in the cache, else they would be recomputed per period
+        self.share_full_sma = len(self.bar_index) * 8 * len(symbol_list) * len(windows) <= self.cache.max_bytes
+
+    def sma(self, start, stop, window):
+        """
+        Rolling mean of the closes of bars start:stop (bars x symbols), as if computed from bar start.
+        Past the first window - 1 bars of the period, its windows hold period bars only, so the values
+        are those of the rolling mean over all the bars, cached once per symbol and window for every fold.
+        That only pays while the full length means of every window of the grid fit in the cache:
+        otherwise the rolling mean of the period alone is computed (and cached), unless the full length
+        one happens to be in the cache already.
+        """
+        n = len(self.bar_index)
+        head = min(start + window - 1, stop)
+        columns = []
+        for j in range(len(self.symbol_list)):
+            full = self.cache.lookup(self._sma_key(j, 0, n, window))
+            if full is None and self.share_full_sma:
+                full = self._cached_sma(j, 0, n, window)
+            if full is not None:
+                columns.append(np.concatenate((self._cached_sma(j, start, head, window), full[head:stop])))
+            else:
+                columns.append(self._cached_sma(j, start, stop, window))
+        return np.column_stack(columns)
+
+    def _sma_key(self, j, start, stop, window):
+        return (self.symbol_list[j], 'close', 'sma', window, self.bar_index[start], self.bar_index[stop - 1])
+
+    def _cached_sma(self, j, start, stop, window):
+        if stop <= start:
+            return np.empty(0)
+        return self.cache.get(self._sma_key(j, start, stop, window),
+                              lambda: rolling_mean(self.backtest.close[start:stop, j], window))
+
+    def evaluate(self, start, stop, short_window=100, long_window=400):
+        """
+        Backtests one parameter set on bars start:stop.
+        :return: the performance stats dict of VectorizedMACrossBacktest.output_summary_stats
+        """
+        period = self.backtest.period(start, stop, short_window, long_window)
+        state = period.calc_signals(self.sma(start, stop, min(short_window, long_window)),
+                                    self.sma(start, stop, long_window))
+        period.run(state)
+        return period.output_summary_stats()
+
+    def run(self):
+        """
+        Runs every fold.
+        :return: pandas DataFrame with one row per fold: its dates, the selected parameters,
+                 the train metric and the test performance stats (prefixed 'test_')
+        """
+        rows = []
+        for fold, (train_start, train_stop, test_start, test_stop) in enumerate(self.folds):
+            best, best_score = None, None
+            for params in self.params:
+                score = self.evaluate(train_start, train_stop, **params)[self.metric]
+                if score == score and (best_score is None or score > best_score):
+                    best, best_score = params, score
+            if best is None: #no parameter set scored on train, keep the first one
+                best, best_score = self.params[0], np.nan
+
+            row = {
+                'fold': fold,
+                'train_start': self.bar_index[train_start],
+                'train_end': self.bar_index[train_stop - 1],
+                'test_start': self.bar_index[test_start],
+                'test_end': self.bar_index[test_stop - 1],
+            }
+            row.update(best)
+            row['train_' + self.metric] = best_score
+            for k, v in self.evaluate(test_start, test_stop, **best).items():
+                row['test_' + k] = v
+            rows.append(row)
+        return pd.DataFrame(rows)
+
+
+if __name__ == "__main__":
+    walk_forward = WalkForwardMACross(
+        'G:/공유 드라이브/Project_TBD/Stock_Data/Minute/', ["005930", "000660"], 1000000.0,
+        {'short_window': [50, 100, 200], 'long_window': [400, 800]}, train='10D', test='5D'
+    )
+    print(walk_forward.run().to_string())
+    print(walk_forward.cache.stats())